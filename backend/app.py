@@ -1,133 +1,571 @@
 
+import os
 import time
 import json
-from fastapi import FastAPI, HTTPException, Depends 
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from config import logger, cache, model
-from models import HospitalRequest, FinalResponse
-from utils import clean_ai_json, generate_cache_key
-from maps_hospitals import get_nearby_hospitals, http_client
-from auth import router as auth_router, get_current_user 
+from fastapi.responses import StreamingResponse, Response, JSONResponse
+from fastapi.encoders import jsonable_encoder
+from config import logger, load_model
+from cache import cache
+from models import HospitalRequest, FinalResponse, BatchTriageRequest
+from utils import (
+    clean_ai_json, generate_triage_key, generate_hospital_key, generate_response_key,
+    normalize_triage_fields, validate_triage, normalize_symptoms, triage_mode, dumps_json
+)
+from maps_hospitals import (
+    get_nearby_hospitals, fetch_candidates, refine_candidates, upstream_stats,
+    shareable_hospitals, personalize_hospitals
+)
+from upstream import client_for, close_clients as close_upstream_clients
+from auth import router as auth_router, get_current_user, users, token_cache_stats
+import password_hashing
+from swr import SWRCache, min_fresh_for
+from similarity import MinHashIndex, SIMILARITY_ENABLED
+from tolerant_json import TolerantJSONParser
+from model_gateway import ModelGateway
+import metrics
+from metrics import stage
+import log_pipeline
+from log_pipeline import log_payload, LOG_AI_PARSE_FAILURE_MAX_CHARS
+from emergency_rules import get_emergency_rules, rule_triage, merge_triage, EMERGENCY_FAST_PATH
+from hospital_index import get_hospital_index, refresh_loop as hospital_index_refresh_loop, OVERPASS_URL
 
-app = FastAPI(title="Smart Health Assistant Backend")
+# Triage routes; the app itself is built by create_app() at the bottom
+router = APIRouter()
 
+# Soft TTL: served as-is. Between soft and hard TTL: served stale while a
+# background task refreshes it. Facilities change far less often than we
+# want to re-run the AI, so hospital lists live much longer than triage.
+TRIAGE_SOFT_TTL = int(os.getenv("TRIAGE_SOFT_TTL", 3600))
+TRIAGE_HARD_TTL = int(os.getenv("TRIAGE_HARD_TTL", 6 * 3600))
+HOSPITALS_SOFT_TTL = int(os.getenv("HOSPITALS_SOFT_TTL", 24 * 3600))
+HOSPITALS_HARD_TTL = int(os.getenv("HOSPITALS_HARD_TTL", 7 * 24 * 3600))
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"], 
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Identical misses share one AI call / one hospital search (see SingleFlight)
+swr_cache = SWRCache(cache)
 
-# Authentication Router (Signup/Login)
-app.include_router(auth_router)
+# All AI calls are bounded, deadlined and circuit-broken (see model_gateway).
+# The model itself is attached by the startup warmup.
+llm = ModelGateway(None)
 
-async def process_health_request(request: HospitalRequest, is_mental: bool):
+# Pre-serialized responses, shared by everyone in a geohash cell: the triage is
+# stored as JSON text and the hospitals as caller-independent facility data. A
+# hit only fills in each hospital's distance and directions from the caller's
+# own location (see personalize_hospitals), skipping FinalResponse validation.
+# A response is only stored while both its triage and hospital list are fresh,
+# and expires when the first of them goes stale, so a stale component is
+# never frozen into it and SWR refreshes take effect.
+RESPONSE_CACHE_ENABLED = os.getenv("TRIAGE_RESPONSE_CACHE", "1") == "1"
+RESPONSE_CACHE_TTL = min(TRIAGE_SOFT_TTL, HOSPITALS_SOFT_TTL)
+
+async def get_cached_body(request: HospitalRequest, is_mental: bool):
+    """Pre-serialized FinalResponse JSON text for a hit, or None."""
     start_time = time.perf_counter()
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    key = generate_response_key(request.symptoms, request.latitude, request.longitude, triage_mode(is_mental))
     try:
-        lat, lon = float(request.latitude), float(request.longitude)
-        
-        # 1. Cache Check
-        cache_key = generate_cache_key(request.symptoms, lat)
-        if cache:
+        with stage("response_cache"):
+            body = await cache.get(key)
+    except Exception as e:
+        logger.error(f"Cache Error: {e}")
+        return None
+    if not body:
+        return None
+    # "<triage JSON>\n<facilities JSON>"; compact JSON text has no raw newlines
+    triage_text, facilities_text = body.split("\n", 1)
+    hospitals = personalize_hospitals(json.loads(facilities_text), request.latitude, request.longitude)
+    latency_ms = round((time.perf_counter() - start_time) * 1000, 2)
+    return f'{{"triage":{triage_text},"hospitals":{dumps_json(hospitals)},"latency_ms":{latency_ms}}}'
+
+async def get_cached_response(request: HospitalRequest, is_mental: bool):
+    """Pre-serialized hit as a ready Response, or None to take the full path."""
+    body = await get_cached_body(request, is_mental)
+    if body is None:
+        return None
+    return Response(content=body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+async def store_response(request: HospitalRequest, is_mental: bool, final_data: dict, fresh_for: float):
+    """Caches the response for fresh_for seconds (capped at RESPONSE_CACHE_TTL)."""
+    ttl = int(min(RESPONSE_CACHE_TTL, fresh_for))
+    if not RESPONSE_CACHE_ENABLED or ttl < 1:
+        return
+    # Validate once on the way in so hits can skip FinalResponse entirely
+    body = jsonable_encoder(FinalResponse(**final_data), exclude={"latency_ms"})
+    key = generate_response_key(request.symptoms, request.latitude, request.longitude, triage_mode(is_mental))
+    stored = f'{dumps_json(body["triage"])}\n{dumps_json(shareable_hospitals(body["hospitals"]))}'
+    try:
+        await cache.setex(key, ttl, stored)
+    except Exception as e:
+        logger.error(f"Cache Error: {e}")
+
+# Optional near-duplicate lookup for symptom text that misses the exact key
+triage_similarity = MinHashIndex()
+
+async def peek_triage(triage_key: str, symptoms: str, mode: str):
+    """Exact triage lookup, then (if enabled) a near-duplicate symptom lookup.
+
+    Returns (triage, seconds it stays fresh); the seconds are <= 0 when it is
+    stale. A near-duplicate hit is copied under the exact key so the next
+    identical request is a plain hit.
+    """
+    triage, fresh_for = await swr_cache.peek_for(triage_key)
+    if triage is not None or not SIMILARITY_ENABLED:
+        return triage, fresh_for
+    similar_key = triage_similarity.lookup(mode, normalize_symptoms(symptoms))
+    if similar_key is None:
+        return None, 0
+    triage, fresh_for = await swr_cache.peek_for(similar_key)
+    if triage is None:
+        triage_similarity.remove(similar_key)
+    else:
+        await swr_cache.set(triage_key, triage, TRIAGE_SOFT_TTL, TRIAGE_HARD_TTL)
+    return triage, fresh_for
+
+def remember_triage(triage_key: str, symptoms: str, mode: str):
+    if SIMILARITY_ENABLED:
+        triage_similarity.add(mode, normalize_symptoms(symptoms), triage_key)
+
+# "speculative": start a generic hospital search alongside the AI call and
+# refine it once the triage is known. "sequential": search after the AI call.
+PIPELINE_MODE = os.getenv("TRIAGE_PIPELINE_MODE", "sequential")
+
+def start_prefetch(lat: float, lon: float):
+    if PIPELINE_MODE != "speculative":
+        return None
+    return asyncio.create_task(fetch_candidates(lat, lon))
+
+async def search_hospitals(lat: float, lon: float, spec: str, urg: str, prefetch=None):
+    """Refines the prefetched candidates when there are any, else runs a targeted search."""
+    with stage("hospital_search"):
+        if prefetch is not None and not prefetch.cancelled():
             try:
-                cached_res = cache.get(cache_key)
-                if cached_res:
-                    data = json.loads(cached_res)
-                    data["latency_ms"] = round((time.perf_counter() - start_time) * 1000, 2)
-                    return data
+                # shield() keeps the shared prefetch alive if this search is cancelled
+                candidates = await asyncio.shield(prefetch)
+            except asyncio.CancelledError:
+                # The owning request cancelled the prefetch (e.g. during a background
+                # refresh); fall back to a targeted search unless we were cancelled
+                if not prefetch.cancelled():
+                    raise
+                candidates = None
             except Exception as e:
-                logger.error(f"Cache Error: {e}")
-
-        # 2. AI Triage Generation
-        role = "Mental Health Expert" if is_mental else "Medical Triage Doctor"
-        prompt = (
-            f"Act as a {role}. Analyze these symptoms: {request.symptoms}. "
-            "Return JSON ONLY with: urgency, summary, possible_conditions (list), "
-            "advice (list), specialist (string), and emergency (bool)."
-        )
-        
-        try:
-            if not model:
-                raise Exception("AI Model not initialized")
+                logger.warning(f"Hospital prefetch failed: {e}")
+                candidates = None
+            if candidates:
+                return await refine_candidates(candidates, lat, lon, spec, urg)
+        return await get_nearby_hospitals(lat, lon, spec, urg)
 
-            # Call AI and log raw response for debugging
-            res = await model.generate_content_async(prompt)
-            raw_text = getattr(res, 'text', None) or getattr(res, 'response', None) or str(res)
-            logger.info(f"AI raw output: {raw_text[:1000]}")
+def build_triage_prompt(symptoms: str, is_mental: bool):
+    role = "Mental Health Expert" if is_mental else "Medical Triage Doctor"
+    return (
+        f"Act as a {role}. Analyze these symptoms: {symptoms}. "
+        "Return JSON ONLY with: urgency, summary, possible_conditions (list), "
+        "advice (list), specialist (string), and emergency (bool)."
+    )
 
-            triage_dict = clean_ai_json(raw_text)
+def mock_triage():
+    # Mock data for demo
+    return {
+        "urgency": "Moderate",
+        "summary": "Mock summary: Please consult a doctor for proper diagnosis.",
+        "possible_conditions": ["Common cold", "Allergies"],
+        "advice": ["Rest", "Drink fluids", "See a doctor if symptoms persist"],
+        "specialist": "General Physician",
+        "emergency": False
+    }
 
-            if not triage_dict:
-                # Log full raw text when parsing fails
-                logger.warning("AI returned text but parsing JSON failed. Raw text below for debugging:")
-                logger.warning(raw_text)
-                raise ValueError("AI failed to generate valid JSON")
-        except Exception as ai_error:
-            logger.warning(f"AI failed: {str(ai_error)}. Using mock data.")
-            # Mock data for demo
-            triage_dict = {
-                "urgency": "Moderate",
-                "summary": "Mock summary: Please consult a doctor for proper diagnosis.",
-                "possible_conditions": ["Common cold", "Allergies"],
-                "advice": ["Rest", "Drink fluids", "See a doctor if symptoms persist"],
-                "specialist": "General Physician",
-                "emergency": False
-            }
-
-        # 3. Hospital Search (Logic handles IP fallback internally if 0,0)
-        spec = str(triage_dict.get("specialist", "General Physician"))
-        urg = str(triage_dict.get("urgency", "Moderate"))
-        hospitals = await get_nearby_hospitals(lat, lon, spec, urg)
-
-        # 4. Final Response Construction
+async def generate_triage(symptoms: str, is_mental: bool):
+    """Calls the AI model; raises if it is unavailable or returns unparseable output."""
+    # Call AI and log (a sample of) the raw response for debugging
+    raw_text = await llm.generate(build_triage_prompt(symptoms, is_mental))
+    log_payload(logger, "ai_output", raw_text)
+
+    with stage("parse"):
+        triage_dict = clean_ai_json(raw_text)
+
+    if not triage_dict:
+        # Log the raw text (up to LOG_AI_PARSE_FAILURE_MAX_CHARS) when parsing fails
+        log_payload(logger, "ai_parse_failure", raw_text, level=logging.WARNING, max_chars=LOG_AI_PARSE_FAILURE_MAX_CHARS)
+        raise ValueError("AI failed to generate valid JSON")
+    return triage_dict
+
+async def get_hospitals_for(lat: float, lon: float, triage_dict: dict, prefetch=None):
+    """(hospitals, seconds the list stays fresh).
+
+    The cached list is shared by the whole geohash cell, so it holds facility
+    data only; distances and directions are computed for this caller.
+    """
+    # Hospital Search (Logic handles IP fallback internally if 0,0)
+    spec = str(triage_dict.get("specialist", "General Physician"))
+    urg = str(triage_dict.get("urgency", "Moderate"))
+    searched = None
+
+    async def load():
+        nonlocal searched
+        searched = await search_hospitals(lat, lon, spec, urg, prefetch)
+        return shareable_hospitals(searched)
+
+    facilities, fresh_for = await swr_cache.get_for(
+        generate_hospital_key(lat, lon, spec, urg), load, HOSPITALS_SOFT_TTL, HOSPITALS_HARD_TTL
+    )
+    # The search itself ran for this caller: keep its (driving) distances
+    if searched is not None:
+        return searched, fresh_for
+    return personalize_hospitals(facilities, lat, lon), fresh_for
+
+async def get_hospitals(lat: float, lon: float, triage_dict: dict, prefetch=None):
+    return (await get_hospitals_for(lat, lon, triage_dict, prefetch))[0]
+
+def emergency_match(symptoms: str, mode: str):
+    """Rule triage when the symptoms match an emergency rule, else None."""
+    rules = get_emergency_rules()
+    rule = rules.match(symptoms, mode) if rules else None
+    if rule is None:
+        return None
+    logger.info(f"🚑 Emergency rule '{rule['id']}' matched ({EMERGENCY_FAST_PATH})")
+    return rule_triage(rule)
+
+async def process_health_request(request: HospitalRequest, is_mental: bool):
+    start_time = time.perf_counter()
+    prefetch = None
+    hospital_task = None
+    try:
+        lat, lon = float(request.latitude), float(request.longitude)
+        mode = triage_mode(is_mental)
+        triage_key = generate_triage_key(request.symptoms, mode)
+        load_triage = lambda: generate_triage(request.symptoms, is_mental)
+        used_mock = False
+
+        # 1. Emergency rules: no network, so an emergency search starts right away
+        rule_dict = emergency_match(request.symptoms, mode)
+        if rule_dict is not None:
+            hospital_task = asyncio.create_task(get_hospitals_for(lat, lon, rule_dict))
+
+        if rule_dict is not None and EMERGENCY_FAST_PATH == "skip":
+            triage_dict, triage_fresh_for = rule_dict, RESPONSE_CACHE_TTL
+        else:
+            # 2. Cache Check (stale entries are served and refreshed in the background)
+            with stage("cache"):
+                triage_dict, triage_fresh_for = await peek_triage(triage_key, request.symptoms, mode)
+            if triage_dict is not None:
+                swr_cache.revalidate(triage_key, triage_fresh_for > 0, load_triage, TRIAGE_SOFT_TTL, TRIAGE_HARD_TTL)
+            else:
+                # 3. AI Triage Generation; the location is known up front, so
+                # search for hospitals while the AI works
+                if hospital_task is None:
+                    prefetch = start_prefetch(lat, lon)
+                try:
+                    triage_dict = await swr_cache.load(triage_key, load_triage, TRIAGE_SOFT_TTL, TRIAGE_HARD_TTL)
+                    triage_fresh_for = min_fresh_for(TRIAGE_SOFT_TTL)
+                    remember_triage(triage_key, request.symptoms, mode)
+                except Exception as ai_error:
+                    logger.warning(f"AI failed: {str(ai_error)}. Using {'rule' if rule_dict else 'mock'} data.")
+                    triage_dict = rule_dict or mock_triage()
+                    used_mock = True
+            if rule_dict is not None and not used_mock:
+                triage_dict = merge_triage(rule_dict, triage_dict)
+
+        # 4. Hospital Search (the merged triage keeps the rule's specialist and urgency)
+        if hospital_task is not None:
+            hospitals, hospitals_fresh_for = await hospital_task
+        else:
+            hospitals, hospitals_fresh_for = await get_hospitals_for(lat, lon, triage_dict, prefetch)
+
+        # 5. Final Response Construction
         duration_ms = (time.perf_counter() - start_time) * 1000
         final_data = {
             "triage": triage_dict, 
             "hospitals": hospitals,
             "latency_ms": round(duration_ms, 2)
         }
-        
-        if cache:
-            cache.setex(cache_key, 3600, json.dumps(final_data))
-
+        if not used_mock and hospitals:
+            await store_response(request, is_mental, final_data, min(triage_fresh_for, hospitals_fresh_for))
         return final_data
 
     except Exception as e:
         logger.error(f"CRASH: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for task in (hospital_task, prefetch):
+            if task is not None and not task.done():
+                task.cancel()
+
+# =========================
+# STREAMING (SSE) TRIAGE
+# =========================
+# Top-level fields acted on before the model finishes
+STREAMED_FIELDS = ("urgency", "specialist", "emergency")
 
-@app.get("/health")
-async def health_check():
-    return {"status": "online", "redis": "connected" if cache else "degraded"}
+def sse_event(event: str, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
+async def stream_health_request(request: HospitalRequest, is_mental: bool):
+    """SSE variant of process_health_request.
 
+    Emits `triage_partial` as soon as urgency/emergency are parsed, starts the
+    hospital search the moment `specialist` appears, then emits the full
+    `triage`, the `hospitals` and a final `done` event. An emergency rule match
+    emits `triage_partial` and starts the search before the AI is called.
+    """
+    start_time = time.perf_counter()
+    lat, lon = float(request.latitude), float(request.longitude)
+    mode = triage_mode(is_mental)
+    triage_key = generate_triage_key(request.symptoms, mode)
+    rule_dict = emergency_match(request.symptoms, mode)
+    skip_ai = rule_dict is not None and EMERGENCY_FAST_PATH == "skip"
+
+    if skip_ai:
+        triage_dict, fresh = rule_dict, True
+    else:
+        with stage("cache"):
+            triage_dict, fresh_for = await peek_triage(triage_key, request.symptoms, mode)
+        fresh = fresh_for > 0
+    if triage_dict is not None:
+        try:
+            if not skip_ai:
+                swr_cache.revalidate(
+                    triage_key, fresh, lambda: generate_triage(request.symptoms, is_mental),
+                    TRIAGE_SOFT_TTL, TRIAGE_HARD_TTL
+                )
+                if rule_dict is not None:
+                    triage_dict = merge_triage(rule_dict, triage_dict)
+            yield sse_event("triage", triage_dict)
+            yield sse_event("hospitals", await get_hospitals(lat, lon, triage_dict))
+            yield sse_event("done", {"latency_ms": round((time.perf_counter() - start_time) * 1000, 2), "cached": not skip_ai})
+        except Exception as e:
+            logger.error(f"CRASH: {str(e)}")
+            yield sse_event("error", {"detail": str(e)})
+        return
 
+    prefetch = start_prefetch(lat, lon) if rule_dict is None else None
+    hospital_task = None
+    search_key = None
+    sent = {}
+    chunks = []
+    parser = TolerantJSONParser()
+    parse_ms = 0.0
 
-@app.post("/api/hospitals/nearby", response_model=FinalResponse)
+    def start_search(spec, urg):
+        nonlocal hospital_task, search_key
+        # Only the specialist and the emergency/non-emergency split change the search
+        key = (str(spec), str(urg).lower() == "high")
+        if key == search_key:
+            return
+        if hospital_task:
+            hospital_task.cancel()
+        search_key = key
+        triage_so_far = {"specialist": str(spec), "urgency": str(urg)}
+        hospital_task = asyncio.create_task(get_hospitals(lat, lon, triage_so_far, prefetch))
+
+    try:
+        if rule_dict is not None:
+            # The rule already decided urgency and specialist; the AI cannot change them
+            yield sse_event("triage_partial", {"urgency": "High", "emergency": True})
+            start_search(rule_dict["specialist"], "High")
+        try:
+            async for chunk in llm.stream(build_triage_prompt(request.symptoms, is_mental)):
+                chunks.append(chunk)
+                # Only the new text is parsed; completed top-level fields come out as they close
+                parse_start = time.perf_counter()
+                new = {k: v for k, v in parser.feed(chunk).pop_completed() if k in STREAMED_FIELDS}
+                parse_ms += (time.perf_counter() - parse_start) * 1000
+                if not new or rule_dict is not None:
+                    continue
+                normalize_triage_fields(new)
+                sent.update(new)
+                if "urgency" in new or "emergency" in new:
+                    yield sse_event("triage_partial", {k: sent[k] for k in ("urgency", "emergency") if k in sent})
+                if "specialist" in sent:
+                    start_search(sent["specialist"], sent.get("urgency", "Moderate"))
+
+            raw_text = "".join(chunks)
+            log_payload(logger, "ai_output", raw_text, stream=True)
+            parse_start = time.perf_counter()
+            triage_dict = validate_triage(parser.finish())
+            metrics.observe("parse", parse_ms + (time.perf_counter() - parse_start) * 1000)
+            if not triage_dict:
+                log_payload(logger, "ai_parse_failure", raw_text, level=logging.WARNING, max_chars=LOG_AI_PARSE_FAILURE_MAX_CHARS, stream=True)
+                raise ValueError("AI failed to generate valid JSON")
+            await swr_cache.set(triage_key, triage_dict, TRIAGE_SOFT_TTL, TRIAGE_HARD_TTL)
+            remember_triage(triage_key, request.symptoms, mode)
+            if rule_dict is not None:
+                triage_dict = merge_triage(rule_dict, triage_dict)
+        except Exception as ai_error:
+            logger.warning(f"AI failed: {str(ai_error)}. Using {'rule' if rule_dict else 'mock'} data.")
+            triage_dict = rule_dict or mock_triage()
+
+        yield sse_event("triage", triage_dict)
+
+        # Restart the search only if the final triage changed what to look for
+        start_search(triage_dict.get("specialist", "General Physician"), triage_dict.get("urgency", "Moderate"))
+        hospitals = await hospital_task
+        yield sse_event("hospitals", hospitals)
+
+        duration_ms = round((time.perf_counter() - start_time) * 1000, 2)
+        yield sse_event("done", {"latency_ms": duration_ms, "cached": False})
+    except Exception as e:
+        logger.error(f"CRASH: {str(e)}")
+        yield sse_event("error", {"detail": str(e)})
+    finally:
+        for task in (hospital_task, prefetch):
+            if task and not task.done():
+                task.cancel()
+
+def sse_response(events):
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# =========================
+# BATCH TRIAGE (NDJSON)
+# =========================
+# Items with the same canonical symptoms and location are answered once.
+# Hospital searches in the same cell for the same specialist/tier already
+# share one upstream call (and cache entry) through the SWR hospital keys.
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 100))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+
+async def triage_batch_item(request: HospitalRequest, is_mental: bool, slots: asyncio.Semaphore):
+    """One unique batch item as JSON text (a FinalResponse or an error)."""
+    async with slots:
+        try:
+            body = await get_cached_body(request, is_mental)
+            if body is None:
+                final_data = await process_health_request(request, is_mental)
+                body = dumps_json(jsonable_encoder(FinalResponse(**final_data)))
+            return 200, body
+        except HTTPException as e:
+            return e.status_code, dumps_json({"detail": e.detail})
+        except Exception as e:
+            logger.error(f"Batch item failed: {e}")
+            return 500, dumps_json({"detail": str(e)})
+
+async def stream_batch(batch: BatchTriageRequest):
+    """Yields one NDJSON line per input item, in completion order."""
+    mode = triage_mode(batch.mental_health)
+    groups = {}  # dedupe key -> indices of identical items
+    for index, item in enumerate(batch.requests):
+        # Exact coordinates too: distances and directions are per location
+        key = (generate_response_key(item.symptoms, item.latitude, item.longitude, mode), item.latitude, item.longitude)
+        groups.setdefault(key, []).append(index)
+
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    tasks = {
+        asyncio.create_task(triage_batch_item(batch.requests[indices[0]], batch.mental_health, slots)): indices
+        for indices in groups.values()
+    }
+    logger.info(f"📦 Batch of {len(batch.requests)} items, {len(tasks)} unique")
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                status, body = task.result()
+                field = "result" if status == 200 else "error"
+                for index in tasks[task]:
+                    yield f'{{"index":{index},"status":{status},"{field}":{body}}}\n'
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+@router.post("/api/triage/batch")
+async def batch_triage_endpoint(batch: BatchTriageRequest, username: str = Depends(get_current_user)):
+    if len(batch.requests) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {BATCH_MAX_ITEMS} items)")
+    logger.info(f"Authorized Request from {username} for batch triage")
+    return StreamingResponse(
+        stream_batch(batch),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/metrics")
+async def metrics_endpoint():
+    llm_stats, cache_stats, flight_stats = llm.stats(), cache.stats(), swr_cache.flight.stats()
+    gauges = {
+        "llm_in_flight": llm_stats["in_flight"],
+        "llm_queued": llm_stats["queued"],
+        "llm_circuit_open": int(llm_stats["state"] != "closed"),
+        "cache_hit_rate": cache_stats["hit_rate"],
+        "redis_up": int(cache.redis_ok),
+        "singleflight_leaders": flight_stats["leaders"],
+        "singleflight_followers": flight_stats["followers"],
+    }
+    return Response(content=metrics.render_prometheus(gauges), media_type="text/plain; version=0.0.4")
+
+@router.get("/health/live")
+async def liveness_check():
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+async def readiness_check(request: Request):
+    state = request.app.state
+    body = {"ready": state.ready, "components": state.components, "startup_ms": state.startup_ms}
+    if not state.ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+@router.get("/health")
+async def health_check(request: Request):
+    rules = get_emergency_rules()
+    state = request.app.state
+    return {
+        "status": "online",
+        "ready": state.ready,
+        "components": state.components,
+        "redis": "connected" if cache.redis_ok else "degraded",
+        "cache": cache.stats(),
+        "auth_tokens": token_cache_stats(),
+        "swr": swr_cache.stats(),
+        "similarity": triage_similarity.stats(),
+        "llm": llm.stats(),
+        "emergency_rules": rules.stats() if rules else None,
+        "logging": log_pipeline.stats(),
+        "upstreams": upstream_stats(),
+    }
+
+
+
+
+@router.post("/api/hospitals/nearby", response_model=FinalResponse)
 async def physical_triage_endpoint(request: HospitalRequest, username: str = Depends(get_current_user)):
     logger.info(f"Authorized Request from {username} for physical triage")
-    return await process_health_request(request, False)
+    return await get_cached_response(request, False) or await process_health_request(request, False)
 
-@app.post("/api/mental-health/analyze", response_model=FinalResponse)
+@router.post("/api/mental-health/analyze", response_model=FinalResponse)
 async def mental_triage_endpoint(request: HospitalRequest, username: str = Depends(get_current_user)):
     logger.info(f"Authorized Request from {username} for mental health triage")
-    return await process_health_request(request, True)
+    return await get_cached_response(request, True) or await process_health_request(request, True)
+
+@router.post("/api/hospitals/nearby/stream")
+async def physical_triage_stream_endpoint(request: HospitalRequest, username: str = Depends(get_current_user)):
+    logger.info(f"Authorized Request from {username} for streaming physical triage")
+    return sse_response(stream_health_request(request, False))
+
+@router.post("/api/mental-health/analyze/stream")
+async def mental_triage_stream_endpoint(request: HospitalRequest, username: str = Depends(get_current_user)):
+    logger.info(f"Authorized Request from {username} for streaming mental health triage")
+    return sse_response(stream_health_request(request, True))
 
 # Debug endpoint (enabled only when DEBUG_ALLOW=1 in backend/.env)
 from fastapi import Body
 
-@app.post('/api/debug/ai')
+@router.post('/api/debug/ai')
 async def debug_ai(prompt: str = Body(...), username: str = Depends(get_current_user)):
     if os.getenv('DEBUG_ALLOW') != '1':
         raise HTTPException(status_code=403, detail='Debug endpoint disabled')
-    if not model:
+    if not llm.model:
         raise HTTPException(status_code=503, detail='No AI model configured')
 
     try:
-        res = await model.generate_content_async(prompt)
-        raw_text = getattr(res, 'text', None) or getattr(res, 'response', None) or str(res)
+        raw_text = await llm.generate(prompt)
         parsed = clean_ai_json(raw_text)
         return {
             'raw': raw_text,
@@ -136,6 +574,97 @@ async def debug_ai(prompt: str = Body(...), username: str = Depends(get_current_
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    await http_client.aclose()
\ No newline at end of file
+# =========================
+# STARTUP / READINESS
+# =========================
+# Backends are initialized concurrently in the background, so the server
+# accepts connections (liveness) right away; /health/ready turns 200 once all
+# of them have settled. Requests before that use the same fallbacks as a
+# degraded backend (local cache, mock triage).
+STARTUP_WAIT_FOR_WARMUP = os.getenv("STARTUP_WAIT_FOR_WARMUP", "0") == "1"
+WARMUP_COMPONENTS = ("redis", "model", "users_db", "hospital_index", "emergency_rules")
+
+async def warm_component(state, name: str, init):
+    """Runs one initializer; a falsy result means "up, but degraded"."""
+    start = time.perf_counter()
+    try:
+        ok = await init()
+        state.components[name] = "ready" if ok else "degraded"
+    except Exception as e:
+        logger.error(f"❌ Warmup of {name} failed: {e}")
+        state.components[name] = "failed"
+    logger.info(f"⏱️ {name}: {state.components[name]} in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+async def init_model():
+    llm.model = await asyncio.to_thread(load_model)
+    return llm.model is not None
+
+async def init_users_db():
+    await asyncio.to_thread(users.open)
+    return True
+
+async def warm_up(state):
+    start = time.perf_counter()
+    await asyncio.gather(
+        warm_component(state, "redis", cache.connect),
+        warm_component(state, "model", init_model),
+        warm_component(state, "users_db", init_users_db),
+        warm_component(state, "hospital_index", lambda: asyncio.to_thread(get_hospital_index)),
+        warm_component(state, "emergency_rules", lambda: asyncio.to_thread(get_emergency_rules)),
+    )
+    state.startup_ms = round((time.perf_counter() - start) * 1000, 1)
+    # Everything but the user DB has a fallback, so only the DB gates readiness
+    state.ready = state.components["users_db"] == "ready"
+    logger.info(f"🚀 Warmup finished in {state.startup_ms} ms ({'ready' if state.ready else 'NOT ready'})")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in every worker after fork: all connections, pools, threads and the
+    # model client are created here, so nothing is shared between workers but Redis
+    app.state.warmup = asyncio.create_task(warm_up(app.state))
+    if STARTUP_WAIT_FOR_WARMUP:
+        await app.state.warmup
+    # Keeps the offline hospital index fresh when HOSPITAL_INDEX_REFRESH_BBOX is set
+    app.state.index_refresher = asyncio.create_task(hospital_index_refresh_loop(client_for(OVERPASS_URL)))
+    try:
+        yield
+    finally:
+        app.state.warmup.cancel()
+        app.state.index_refresher.cancel()
+        await close_upstream_clients()
+        await cache.close()
+        password_hashing.shutdown()
+        users.close()
+        llm.close()
+
+# =========================
+# APP FACTORY
+# =========================
+def create_app():
+    """Builds the ASGI app. Safe to call before fork (gunicorn --preload,
+    uvicorn --workers): per-worker resources are only created in lifespan.
+    """
+    app = FastAPI(title="Smart Health Assistant Backend", lifespan=lifespan)
+    app.state.ready = False
+    app.state.startup_ms = None
+    app.state.components = {name: "pending" for name in WARMUP_COMPONENTS}
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["Server-Timing"],
+    )
+
+    # Per-stage timings: Server-Timing header, /metrics histograms, slow-request profiles
+    app.add_middleware(metrics.ServerTimingMiddleware)
+
+    # Authentication Router (Signup/Login)
+    app.include_router(auth_router)
+    app.include_router(router)
+    return app
+
+# `uvicorn app:app` (single process) or `uvicorn app:create_app --factory --workers N`
+app = create_app()
@@ -1,17 +1,20 @@
 import jwt
 import datetime
+import hashlib
 import os
+import time
 import sqlite3
 from fastapi import APIRouter, HTTPException, Header
 from pydantic import BaseModel, EmailStr
-from passlib.context import CryptContext
 from config import logger
+from user_store import UserRepository
+from cache import LocalCache, cache
+from password_hashing import hash_password, verify_password, HashingBusy
 
 # =========================
 # ROUTER CONFIG
 # =========================
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
 # =========================
 # JWT CONFIG
@@ -23,18 +26,8 @@ TOKEN_EXPIRE_HOURS = 24
 # =========================
 # DATABASE (SQLITE)
 # =========================
-conn = sqlite3.connect("users.db", check_same_thread=False)
-cursor = conn.cursor()
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT UNIQUE NOT NULL,
-    email TEXT UNIQUE NOT NULL,
-    password TEXT NOT NULL
-)
-""")
-conn.commit()
+# Opened by the app's startup warmup (or lazily on first query)
+users = UserRepository()
 
 # =========================
 # SCHEMAS
@@ -59,32 +52,147 @@ def create_access_token(username: str):
     }
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
+# =========================
+# VERIFIED TOKEN CACHE
+# =========================
+# digest -> (username, iat)
+TOKEN_CACHE_MAX_ITEMS = int(os.getenv("TOKEN_CACHE_MAX_ITEMS", 10000))
+# How long a worker trusts a verified token before checking Redis for
+# revocations made by other workers again
+TOKEN_RECHECK_S = float(os.getenv("TOKEN_RECHECK_S", 30))
+_token_cache = LocalCache(max_items=TOKEN_CACHE_MAX_ITEMS)
+_revoked_tokens = LocalCache(max_items=TOKEN_CACHE_MAX_ITEMS)
+_user_revoked_before = {}
+token_cache_hits = 0
+token_cache_misses = 0
+
+# Revocations are shared through Redis so they hold in every worker:
+#   revoked:token:<digest>  until the token would have expired anyway
+#   revoked:user:<username> "revoked before" timestamp, for as long as an
+#                           earlier token can still be valid
+# The local copies above answer this worker's own revocations (and keep
+# working in Degraded Mode).
+REVOKED_TOKEN_PREFIX = "revoked:token:"
+REVOKED_USER_PREFIX = "revoked:user:"
+
+def _token_digest(token: str):
+    return hashlib.sha256(token.encode()).digest()
+
+def _is_revoked(username: str, issued_at: float):
+    return issued_at < _user_revoked_before.get(username, 0)
+
+async def _is_revoked_shared(digest: bytes, username: str, issued_at: float):
+    """Checks the revocations other workers published to Redis."""
+    redis = cache.redis
+    if redis is None:
+        return False
+    try:
+        token_revoked, revoked_before = await redis.pipeline(transaction=False).exists(
+            REVOKED_TOKEN_PREFIX + digest.hex()
+        ).get(REVOKED_USER_PREFIX + username).execute()
+    except Exception as e:
+        logger.error(f"Token revocation check error: {e}")
+        return False
+    if revoked_before:
+        _user_revoked_before[username] = max(_user_revoked_before.get(username, 0), int(revoked_before))
+    return bool(token_revoked) or _is_revoked(username, issued_at)
+
+async def _publish_revocation(key: str, value, ttl: int):
+    redis = cache.redis
+    if redis is None:
+        logger.warning(f"⚠️ Redis unavailable: revocation {key} only applies to this worker")
+        return
+    try:
+        await redis.set(key, value, ex=max(1, ttl))
+    except Exception as e:
+        logger.error(f"Token revocation publish error: {e}")
+
+async def revoke_token(token: str):
+    """Rejects this token from now on, until it would have expired anyway."""
+    digest = _token_digest(token)
+    _token_cache.delete(digest)
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
+        ttl = payload["exp"] - time.time()
+    except jwt.InvalidTokenError:
+        return
+    if ttl > 0:
+        _revoked_tokens.set(digest, True, ttl)
+        await _publish_revocation(REVOKED_TOKEN_PREFIX + digest.hex(), 1, int(ttl) + 1)
+
+async def revoke_user_tokens(username: str):
+    """Rejects every token issued to username before now (e.g. password change)."""
+    revoked_before = int(time.time())
+    _user_revoked_before[username] = revoked_before
+    await _publish_revocation(REVOKED_USER_PREFIX + username, revoked_before, TOKEN_EXPIRE_HOURS * 3600)
+
+def token_cache_stats():
+    lookups = token_cache_hits + token_cache_misses
+    return {
+        "entries": len(_token_cache),
+        "hits": token_cache_hits,
+        "misses": token_cache_misses,
+        "hit_rate": round(token_cache_hits / lookups, 4) if lookups else 0.0
+    }
+
 async def get_current_user(authorization: str = Header(None)):
+    global token_cache_hits, token_cache_misses
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Unauthorized: No token provided")
 
     token = authorization.split(" ")[1]
+    digest = _token_digest(token)
+
+    # Hot path: token already verified and not yet expired
+    cached = _token_cache.get(digest)
+    if cached is not None:
+        token_cache_hits += 1
+        username, issued_at = cached
+        if _is_revoked(username, issued_at):
+            raise HTTPException(status_code=401, detail="Session revoked. Please login again.")
+        return username
+
+    token_cache_misses += 1
+    if _revoked_tokens.get(digest):
+        raise HTTPException(status_code=401, detail="Session revoked. Please login again.")
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload["sub"]
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Session expired. Please login again.")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token.")
 
+    username, issued_at = payload["sub"], payload.get("iat", 0)
+    if _is_revoked(username, issued_at):
+        raise HTTPException(status_code=401, detail="Session revoked. Please login again.")
+    if await _is_revoked_shared(digest, username, issued_at):
+        _revoked_tokens.set(digest, True, max(1, payload["exp"] - time.time()))
+        raise HTTPException(status_code=401, detail="Session revoked. Please login again.")
+    ttl = min(payload["exp"] - time.time(), TOKEN_RECHECK_S)
+    if ttl > 0:
+        _token_cache.set(digest, (username, issued_at), ttl)
+    return username
+
+def _auth_busy():
+    # Hashing queue is full: ask the client to retry instead of stalling
+    return HTTPException(
+        status_code=503,
+        detail="Authentication is busy. Please retry shortly.",
+        headers={"Retry-After": "1"}
+    )
+
 # =========================
 # AUTH ENDPOINTS
 # =========================
 @router.post("/signup")
 async def signup(user: UserSignup):
-    hashed_password = pwd_context.hash(user.password)
+    try:
+        hashed_password = await hash_password(user.password)
+    except HashingBusy:
+        raise _auth_busy()
 
     try:
-        cursor.execute(
-            "INSERT INTO users (username, email, password) VALUES (?, ?, ?)",
-            (user.username, user.email, hashed_password)
-        )
-        conn.commit()
+        await users.create(user.username, user.email, hashed_password)
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="Username or email already exists")
 
@@ -96,18 +204,19 @@ async def signup(user: UserSignup):
 
 @router.post("/login")
 async def login(user: UserLogin):
-    cursor.execute(
-        "SELECT username, email, password FROM users WHERE username = ?",
-        (user.username,)
-    )
-    db_user = cursor.fetchone()
+    db_user = await users.get_by_username(user.username)
 
     if not db_user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     username, email, hashed_password = db_user
 
-    if not pwd_context.verify(user.password, hashed_password):
+    try:
+        password_ok = await verify_password(user.password, hashed_password)
+    except HashingBusy:
+        raise _auth_busy()
+
+    if not password_ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     token = create_access_token(username)
@@ -121,3 +230,9 @@ async def login(user: UserLogin):
             "email": email
         }
     }
+
+@router.post("/logout")
+async def logout(authorization: str = Header(None)):
+    await get_current_user(authorization)
+    await revoke_token(authorization.split(" ")[1])
+    return {"message": "Logged out"}
@@ -0,0 +1,71 @@
+"""Event-loop latency while many logins verify passwords concurrently.
+
+Compares verifying inline on the loop (the old behaviour) with the worker
+pool in password_hashing. A ticker task sleeps 1 ms in a loop and records how
+late it wakes up; that lag is what every other request would feel.
+
+    python benchmarks/bench_auth_hashing.py [concurrent_logins]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import password_hashing  # noqa: E402
+
+TICK_S = 0.001
+
+
+async def ticker(stop, lags):
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(TICK_S)
+        lags.append((time.perf_counter() - t - TICK_S) * 1000)
+
+
+async def run(mode: str, logins: int, hashed: str):
+    async def inline_verify():
+        return password_hashing.pwd_context.verify("correct horse", hashed)
+
+    async def pooled_verify():
+        try:
+            return await password_hashing.verify_password("correct horse", hashed)
+        except password_hashing.HashingBusy:
+            return None
+
+    verify = inline_verify if mode == "inline" else pooled_verify
+    stop, lags = asyncio.Event(), []
+    tick = asyncio.create_task(ticker(stop, lags))
+    await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[verify() for _ in range(logins)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+
+    lags.sort()
+    shed = sum(1 for r in results if r is None)
+    print(
+        f"{mode:>7}: {logins} logins in {elapsed * 1000:8.1f} ms | "
+        f"loop lag p50 {statistics.median(lags):7.2f} ms  "
+        f"p99 {lags[int(len(lags) * 0.99) - 1]:7.2f} ms  max {lags[-1]:7.2f} ms | shed {shed}"
+    )
+
+
+async def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    hashed = password_hashing.pwd_context.hash("correct horse")
+    print(f"pbkdf2_sha256 rounds={password_hashing.PBKDF2_ROUNDS} "
+          f"executor={password_hashing.HASH_EXECUTOR} workers={password_hashing.HASH_WORKERS}")
+    await run("inline", logins, hashed)
+    await run("pool", logins, hashed)
+    password_hashing.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
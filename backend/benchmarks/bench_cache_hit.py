@@ -0,0 +1,80 @@
+"""Requests/sec on the cache-hit path, with and without pre-serialized responses.
+
+"dict path" is the regular hit path: cached triage and hospitals are decoded,
+assembled, validated through FinalResponse and re-serialized by FastAPI.
+"bytes path" returns the stored triage text, with only the hospitals'
+distances and directions recomputed for the caller and latency_ms added.
+The app is driven in-process through httpx's ASGI transport, with auth and
+upstreams stubbed, so only the hit path itself is measured.
+
+    python benchmarks/bench_cache_hit.py [requests]
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+import app as backend  # noqa: E402
+from auth import get_current_user  # noqa: E402
+
+TRIAGE = {
+    "urgency": "Moderate",
+    "summary": "Likely a viral infection; rest and hydrate.",
+    "possible_conditions": ["Viral fever", "Influenza", "Dengue"],
+    "advice": ["Rest", "Drink fluids", "Monitor temperature", "See a doctor if it persists"],
+    "specialist": "General Physician",
+    "emergency": False,
+}
+HOSPITALS = [{
+    "name": f"Hospital {i}", "lat": 12.84 + i / 100, "lon": 80.15, "address": "Main Road",
+    "rating": 4.2, "maps_url": "https://www.google.com/maps/dir/?api=1", "distance_km": 1.0 + i,
+    "available_specialist": "General Physician",
+} for i in range(8)]
+BODY = {"latitude": 12.8407, "longitude": 80.1534, "symptoms": "fever and headache"}
+
+
+async def fake_triage(symptoms, is_mental):
+    return dict(TRIAGE)
+
+
+async def fake_search(lat, lon, spec, urg, prefetch=None):
+    return list(HOSPITALS)
+
+
+async def measure(client, n: int, concurrency: int = 32):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            resp = await client.post("/api/hospitals/nearby", json=BODY)
+            assert resp.status_code == 200, resp.text
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(n)])
+    return n / (time.perf_counter() - start)
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    # Per-request log lines would dominate the numbers
+    logging.disable(logging.INFO)
+    backend.app.dependency_overrides[get_current_user] = lambda: "bench"
+    backend.generate_triage = fake_triage
+    backend.search_hospitals = fake_search
+
+    transport = httpx.ASGITransport(app=backend.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for enabled, label in ((False, "dict path"), (True, "bytes path")):
+            backend.RESPONSE_CACHE_ENABLED = enabled
+            await client.post("/api/hospitals/nearby", json=BODY)  # warm the caches
+            rps = await measure(client, n)
+            print(f"{label:>10}: {rps:9.0f} req/s over {n} hits")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
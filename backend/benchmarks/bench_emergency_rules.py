@@ -0,0 +1,134 @@
+"""Cost of the emergency rule check that runs before every AI call.
+
+Compares the compiled Aho-Corasick matcher with a naive scan that tests
+every phrase of every rule against the text, on a mix of emergency and
+routine symptom descriptions. The ruleset is the shipped one, optionally
+padded with synthetic rules to show how each approach scales.
+
+Before timing, the shipped ruleset is run against REGRESSION_CASES (known
+true and false positives, including negation scope); any mismatch is
+reported and the script exits non-zero.
+
+    python benchmarks/bench_emergency_rules.py [rounds] [extra_rules]
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emergency_rules import EmergencyRules, RULES_PATH, tokenize  # noqa: E402
+
+SYMPTOMS = [
+    "crushing chest pain radiating to my left arm and sweating",
+    "fever, sore throat and a runny nose for three days",
+    "my father has face drooping and slurred speech since this morning",
+    "itchy rash on both forearms after gardening",
+    "I have been feeling hopeless and keep thinking I want to die",
+    "mild headache and tiredness after a long flight, no chest pain",
+    "lower back pain when lifting, worse in the evening",
+    "my child is choking and turning blue",
+    "stomach cramps and loose stools after eating street food yesterday",
+    "anxious before exams, trouble sleeping and poor appetite",
+]
+
+# (symptoms, mode, expected rule id or None)
+REGRESSION_CASES = [
+    ("crushing chest pain radiating to my left arm and sweating", "physical", "cardiac"),
+    ("my father has face drooping and slurred speech since this morning", "physical", "stroke"),
+    ("I think my mother is having a stroke", "physical", "stroke"),
+    ("my new shoes keep fitting badly", "physical", None),
+    ("I had a heat stroke last year", "physical", None),
+    ("no history of seizures", "physical", None),
+    ("mild headache and tiredness after a long flight, no chest pain", "physical", None),
+    ("denies any chest pain or shortness of breath", "physical", None),
+    ("no fever but my son is having seizures", "physical", "consciousness"),
+    ("not hungry, my child is choking", "physical", "breathing"),
+    ("I don't know why my dad has slurred speech", "physical", "stroke"),
+    ("I have been feeling hopeless and keep thinking I want to die", "mental", "suicide"),
+    ("I hurt myself playing football, ankle swollen", "physical", None),
+    ("I keep cutting myself shaving", "physical", None),
+    ("took an overdose of ibuprofen by mistake", "physical", None),
+    ("sometimes I want to hurt myself", "physical", "suicide"),
+    ("I have been cutting myself to cope", "mental", "self_harm"),
+]
+
+
+def check_regressions():
+    rules = EmergencyRules.load()
+    failures = []
+    for symptoms, mode, expected in REGRESSION_CASES:
+        rule = rules.match(symptoms, mode)
+        got = rule["id"] if rule else None
+        if got != expected:
+            failures.append(f"  {symptoms!r} ({mode}): expected {expected}, got {got}")
+    print(f"regression checks: {len(REGRESSION_CASES) - len(failures)}/{len(REGRESSION_CASES)} passed")
+    for failure in failures:
+        print(failure)
+    return not failures
+
+
+def naive_matcher(rules):
+    """Substring test of every (pre-tokenized) phrase of every rule."""
+    compiled = [
+        (rule, [[f" {' '.join(tokenize(p))} " for p in group] for group in rule["all_of"]])
+        for rule in rules
+    ]
+
+    def match(symptoms: str, mode: str):
+        text = " " + " ".join(tokenize(symptoms)) + " "
+        for rule, groups in compiled:
+            if mode in rule["modes"] and all(any(p in text for p in group) for group in groups):
+                return rule
+        return None
+    return match
+
+
+def padded_rules(extra: int):
+    with open(RULES_PATH) as f:
+        data = json.load(f)
+    for i in range(extra):
+        data["rules"].append({
+            "id": f"synthetic_{i}",
+            "modes": ["physical"],
+            "all_of": [[f"synthetic symptom {i} {j}" for j in range(10)]],
+            "triage": data["rules"][0]["triage"],
+        })
+    return data
+
+
+def per_call_us(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for symptoms in SYMPTOMS:
+            fn(symptoms, "physical")
+    return (time.perf_counter() - start) / (rounds * len(SYMPTOMS)) * 1e6
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    extras = [int(sys.argv[2])] if len(sys.argv) > 2 else [0, 100, 1000]
+    if not check_regressions():
+        sys.exit(1)
+
+    for extra in extras:
+        data = padded_rules(extra)
+        start = time.perf_counter()
+        compiled = EmergencyRules(
+            data["rules"], data["negations"], data.get("clause_breaks", ()), data.get("pseudo_negations", ())
+        )
+        build_ms = (time.perf_counter() - start) * 1000
+        phrases = sum(len(g) for r in data["rules"] for g in r["all_of"])
+
+        automaton = per_call_us(compiled.match, rounds)
+        naive = per_call_us(naive_matcher(data["rules"]), max(1, rounds // 10))
+        print(
+            f"{len(data['rules']):5d} rules / {phrases:5d} phrases: "
+            f"automaton {automaton:7.1f} us/call (built in {build_ms:.1f} ms), naive {naive:8.1f} us/call"
+        )
+
+
+if __name__ == "__main__":
+    main()
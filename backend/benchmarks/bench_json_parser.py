@@ -0,0 +1,108 @@
+"""Success rate and throughput of model-output JSON parsing.
+
+Compares the previous multi-attempt parser (regex fence strip, json.loads,
+{...} slice, ast.literal_eval) with the single-pass tolerant parser on a
+corpus of realistic malformed outputs, and times the streaming mode where
+the same text arrives in small chunks. A case only counts as parsed when the
+result is a complete, schema-valid triage with the expected values; cases
+whose expected value is null (output truncated before every field arrived)
+must be rejected.
+
+    python benchmarks/bench_json_parser.py [rounds]
+"""
+
+import ast
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tolerant_json import TolerantJSONParser  # noqa: E402
+from utils import clean_ai_json, validate_triage  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "malformed_llm_outputs.json")
+CHUNK_SIZE = 16  # roughly one streamed token group
+
+
+def legacy_clean_ai_json(text: str):
+    """The parser clean_ai_json used before the tolerant rewrite."""
+    try:
+        if not text or not isinstance(text, str):
+            return None
+        cleaned = re.sub(r"```(?:json)?\s?|\s?```", "", text).strip()
+        try:
+            data = json.loads(cleaned)
+        except Exception:
+            start = cleaned.find('{')
+            end = cleaned.rfind('}')
+            if start == -1 or end == -1 or end <= start:
+                data = None
+            else:
+                snippet = cleaned[start:end+1]
+                try:
+                    data = json.loads(snippet)
+                except Exception:
+                    try:
+                        data = ast.literal_eval(snippet)
+                    except Exception:
+                        data = None
+        if not data:
+            return None
+        if "specialist" in data:
+            spec = data["specialist"]
+            data["specialist"] = spec[0] if isinstance(spec, list) else spec
+        return data
+    except Exception:
+        return None
+
+
+def streamed_parse(text: str):
+    parser = TolerantJSONParser()
+    for i in range(0, len(text), CHUNK_SIZE):
+        parser.feed(text[i:i + CHUNK_SIZE]).pop_completed()
+    return validate_triage(parser.finish())
+
+
+def matches(result, expected):
+    if expected is None:
+        return not result
+    return validate_triage(result) is not None and all(result.get(k) == v for k, v in expected.items())
+
+
+def throughput(parse, cases, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for case in cases:
+            parse(case["text"])
+    return rounds * len(cases) / (time.perf_counter() - start)
+
+
+def run(label, parse, corpus, rounds):
+    failed = [case["name"] for case in corpus if not matches(parse(case["text"]), case["expected"])]
+    strict = [case for case in corpus if case.get("strict")]
+    malformed = [case for case in corpus if not case.get("strict")]
+
+    print(
+        f"{label:>10}: {len(corpus) - len(failed)}/{len(corpus)} parsed correctly, "
+        f"{throughput(parse, strict, rounds):9.0f} parses/s well-formed, "
+        f"{throughput(parse, malformed, rounds):9.0f} parses/s malformed"
+    )
+    if failed:
+        print(f"{'':>12}failed: {', '.join(failed)}")
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with open(CORPUS_PATH) as f:
+        corpus = json.load(f)
+
+    run("legacy", legacy_clean_ai_json, corpus, rounds)
+    run("tolerant", clean_ai_json, corpus, rounds)
+    run("streamed", streamed_parse, corpus, rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Hermetic load test: req/s and latency percentiles per workload.
+
+The real app (routes, auth, cache tiers, model gateway, hospital search) is
+driven in-process through httpx's ASGI transport. Everything it talks to is
+local (see fakes.py):
+
+- Places / Distance Matrix / Overpass: fake HTTP server in a child process,
+  reached over real sockets through GOOGLE_MAPS_BASE_URL / OVERPASS_URL
+- model: FakeModel with configurable latency and error injection
+- Redis: FakeRedis in memory (or a real server with --real-redis)
+- user DB: a temporary SQLite file
+
+Workloads:
+- login: POST /api/auth/login (password hashing + user lookup)
+- triage_hit: /api/hospitals/nearby with repeated symptoms (cache hits)
+- triage_miss: /api/hospitals/nearby with unique symptoms and locations
+  (model call + Places + Distance Matrix, or Overpass with --maps overpass)
+- mental_miss: /api/mental-health/analyze with unique symptoms
+- mixed: 80% triage_hit, 15% triage_miss, 5% login
+
+    python benchmarks/bench_load.py [--requests 300] [--concurrency 32]
+        [--model-latency-ms 800] [--model-error-rate 0] [--upstream-latency-ms 50]
+        [--maps places|overpass] [--scenarios triage_hit,triage_miss]
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx  # noqa: E402
+from fakes import FakeModel, FakeRedis  # noqa: E402
+
+ORIGIN = (12.8407, 80.1534)
+USER = {"username": "loadtest", "email": "loadtest@example.com", "password": "load-test-password"}
+HIT_SYMPTOMS = [f"mild fever and headache since {d} days" for d in range(1, 21)]
+SCENARIOS = ("login", "triage_hit", "triage_miss", "mental_miss", "mixed")
+
+_unique = itertools.count()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values, q: float):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def start_upstreams(port: int, args):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "fakes.py"), "--port", str(port),
+         "--latency-ms", str(args.upstream_latency_ms), "--error-rate", str(args.upstream_error_rate)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/calls", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("fake upstream server did not start")
+
+
+# =========================
+# WORKLOADS
+# =========================
+def unique_location():
+    n = next(_unique)
+    return {"latitude": ORIGIN[0] + (n % 50) * 0.02, "longitude": ORIGIN[1] + (n // 50) * 0.02}
+
+
+def login_request(token):
+    return "/api/auth/login", {"username": USER["username"], "password": USER["password"]}, {}
+
+
+def triage_hit_request(token):
+    body = {"latitude": ORIGIN[0], "longitude": ORIGIN[1], "symptoms": random.choice(HIT_SYMPTOMS)}
+    return "/api/hospitals/nearby", body, {"Authorization": f"Bearer {token}"}
+
+
+def triage_miss_request(token):
+    body = {**unique_location(), "symptoms": f"sore throat and cough, case {next(_unique)}"}
+    return "/api/hospitals/nearby", body, {"Authorization": f"Bearer {token}"}
+
+
+def mental_miss_request(token):
+    body = {**unique_location(), "symptoms": f"trouble sleeping and constant worry, case {next(_unique)}"}
+    return "/api/mental-health/analyze", body, {"Authorization": f"Bearer {token}"}
+
+
+def mixed_request(token):
+    r = random.random()
+    if r < 0.80:
+        return triage_hit_request(token)
+    if r < 0.95:
+        return triage_miss_request(token)
+    return login_request(token)
+
+
+WORKLOADS = {
+    "login": login_request,
+    "triage_hit": triage_hit_request,
+    "triage_miss": triage_miss_request,
+    "mental_miss": mental_miss_request,
+    "mixed": mixed_request,
+}
+
+
+async def run_scenario(client, name: str, token: str, n: int, concurrency: int):
+    make_request = WORKLOADS[name]
+    latencies, errors = [], Counter()
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        path, body, headers = make_request(token)
+        async with sem:
+            start = time.perf_counter()
+            resp = await client.post(path, json=body, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+        if resp.status_code != 200:
+            errors[resp.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(n)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(
+        f"{name:>12}: {n / elapsed:8.1f} req/s  "
+        f"p50 {percentile(latencies, 50):7.1f}  p90 {percentile(latencies, 90):7.1f}  "
+        f"p99 {percentile(latencies, 99):7.1f}  max {latencies[-1]:7.1f} ms  "
+        f"errors {sum(errors.values())}{' ' + str(dict(errors)) if errors else ''}"
+    )
+
+
+async def run(args, upstream_url: str):
+    import app as backend
+    from cache import cache
+    from maps_hospitals import upstream_stats
+
+    fake_model = FakeModel(args.model_latency_ms, args.model_jitter_ms, args.model_error_rate)
+    backend.load_model = lambda: fake_model
+    if not args.real_redis:
+        cache._client = FakeRedis()
+
+    application = backend.app
+    transport = httpx.ASGITransport(app=application)
+    async with application.router.lifespan_context(application):
+        await application.state.warmup
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            await client.post("/api/auth/signup", json=USER)
+            token = (await client.post("/api/auth/login", json=USER)).json()["access_token"]
+            # Prime the entries the hit workloads read
+            for symptoms in HIT_SYMPTOMS:
+                body = {"latitude": ORIGIN[0], "longitude": ORIGIN[1], "symptoms": symptoms}
+                await client.post("/api/hospitals/nearby", json=body, headers={"Authorization": f"Bearer {token}"})
+
+            for name in args.scenarios.split(","):
+                await run_scenario(client, name, token, args.requests, args.concurrency)
+
+        calls = httpx.get(f"{upstream_url}/calls").json()
+        print(f"\nmodel calls: {fake_model.calls}, upstream calls: {calls}")
+        print(f"llm: {backend.llm.stats()}")
+        print(f"cache: {cache.stats()}")
+        for name, api in upstream_stats().items():
+            print(f"{name}: calls {api['calls']}, timeouts {api['timeouts']}, hedges {api['hedges']}, failovers {api['failovers']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--model-latency-ms", type=float, default=800)
+    parser.add_argument("--model-jitter-ms", type=float, default=200)
+    parser.add_argument("--model-error-rate", type=float, default=0.0)
+    parser.add_argument("--upstream-latency-ms", type=float, default=50)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    parser.add_argument("--maps", choices=("places", "overpass"), default="places")
+    parser.add_argument("--real-redis", action="store_true", help="use REDIS_HOST/REDIS_PORT instead of FakeRedis")
+    args = parser.parse_args()
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    port = free_port()
+    upstream_url = f"http://127.0.0.1:{port}"
+    upstreams = start_upstreams(port, args)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Must be set before the backend modules are imported
+            os.environ.update({
+                "USERS_DB_PATH": os.path.join(tmp, "users.db"),
+                "HOSPITAL_INDEX_PATH": os.path.join(tmp, "no-index.idx"),
+                "GOOGLE_MAPS_BASE_URL": upstream_url,
+                "OVERPASS_URL": f"{upstream_url}/api/interpreter",
+                # The fake server doubles as the hedge/failover mirror (there are none by default)
+                "OVERPASS_MIRRORS": f"{upstream_url}/api/interpreter",
+                "GOOGLE_MAPS_API_KEY": "bench-key" if args.maps == "places" else "",
+            })
+            os.chdir(BACKEND_DIR)
+            logging.disable(logging.WARNING)
+            asyncio.run(run(args, upstream_url))
+    finally:
+        upstreams.terminate()
+        upstreams.wait()
+
+
+if __name__ == "__main__":
+    main()
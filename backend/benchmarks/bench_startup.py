@@ -0,0 +1,94 @@
+"""Cold-start cost: module import, startup hook, and time until ready.
+
+Each run is a fresh interpreter, so nothing is warm in sys.modules:
+
+- import: `import app` (everything that runs at module import)
+- startup: the startup hook, i.e. until the server can accept connections
+- ready: until the background warmup (Redis, model, user DB, hospital
+  index, emergency rules) has settled and /health/ready would return 200
+
+The user DB goes to a temporary file. Redis, the model and the hospital index
+are whatever the environment configures; without them the run measures the
+degraded-mode startup.
+
+    python benchmarks/bench_startup.py [runs] [--importtime]
+
+--importtime also prints the slowest modules from `python -X importtime`.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import asyncio, json, logging, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+logging.disable(logging.INFO)
+
+async def main():
+    async with app.app.router.lifespan_context(app.app):
+        t2 = time.perf_counter()
+        await app.app.state.warmup
+        t3 = time.perf_counter()
+    print(json.dumps({
+        "import": (t1 - t0) * 1000,
+        "startup": (t2 - t1) * 1000,
+        "ready": (t3 - t0) * 1000,
+        "components": app.app.state.components,
+    }))
+
+asyncio.run(main())
+"""
+
+
+def run_once(env):
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def slowest_imports(env, top: int = 12):
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative_us), int(self_us), name))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    runs = int(args[0]) if args else 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "USERS_DB_PATH": os.path.join(tmp, "users.db")}
+        results = [run_once(env) for _ in range(runs)]
+
+        for key in ("import", "startup", "ready"):
+            values = [r[key] for r in results]
+            print(f"{key:>8}: median {statistics.median(values):7.1f} ms  (min {min(values):.1f}, max {max(values):.1f})")
+        print(f"components: {results[-1]['components']}")
+
+        if "--importtime" in sys.argv:
+            print("\nslowest imports (cumulative ms / self ms):")
+            for cumulative_us, self_us, name in slowest_imports(env):
+                print(f"  {cumulative_us / 1000:7.1f} {self_us / 1000:7.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
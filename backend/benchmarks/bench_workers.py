@@ -0,0 +1,147 @@
+"""Throughput vs. uvicorn worker count, using the app factory.
+
+For each worker count the script starts
+
+    uvicorn app:create_app --factory --workers N
+
+waits until /health/ready answers, and drives /api/hospitals/nearby from
+several load-generator processes for a fixed time. Nothing leaves the
+machine: no model is configured (mock triage), hospitals come from a
+synthetic offline index, and the user DB is a temporary file. Set
+REDIS_HOST/REDIS_PORT to include the shared Redis tier.
+
+Scaling is bounded by the cores available to the server *and* the load
+generators, so run it on a machine with spare cores.
+
+    python benchmarks/bench_workers.py [worker counts, e.g. 1,2,4] [seconds]
+"""
+
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx  # noqa: E402
+
+ORIGIN = (12.8407, 80.1534)
+SYMPTOMS = ["fever and headache", "sore throat", "back pain", "itchy rash", "stomach ache", "cough and cold"]
+CLIENTS = max(2, os.cpu_count() or 1)
+CONCURRENCY_PER_CLIENT = 32
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def build_synthetic_index(path: str):
+    from hospital_index import build_index
+    rng = random.Random(7)
+    facilities = [{
+        "lat": ORIGIN[0] + rng.uniform(-0.2, 0.2),
+        "lon": ORIGIN[1] + rng.uniform(-0.2, 0.2),
+        "name": f"Facility {i}",
+        "address": "Main Road",
+        "amenity": "hospital" if i % 3 else "clinic",
+    } for i in range(5000)]
+    build_index(facilities, path)
+
+
+def make_token(env):
+    code = "from auth import create_access_token; print(create_access_token('loadtest'))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    return out.stdout.strip().splitlines()[-1]
+
+
+def wait_ready(base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health/ready", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+async def _generate_load(base_url: str, token: str, seconds: float):
+    done = 0
+    stop_at = time.monotonic() + seconds
+    headers = {"Authorization": f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=CONCURRENCY_PER_CLIENT)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=30) as client:
+        async def worker():
+            nonlocal done
+            rng = random.Random()
+            while time.monotonic() < stop_at:
+                body = {"latitude": ORIGIN[0], "longitude": ORIGIN[1], "symptoms": rng.choice(SYMPTOMS)}
+                resp = await client.post("/api/hospitals/nearby", json=body)
+                if resp.status_code == 200:
+                    done += 1
+        await asyncio.gather(*[worker() for _ in range(CONCURRENCY_PER_CLIENT)])
+    return done
+
+
+def load_client(args):
+    return asyncio.run(_generate_load(*args))
+
+
+def measure(workers: int, seconds: float, env: dict, token: str):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:create_app", "--factory",
+         "--workers", str(workers), "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base_url)
+        load_client((base_url, token, 1.0))  # warm every worker's local caches
+        with multiprocessing.Pool(CLIENTS) as pool:
+            start = time.perf_counter()
+            counts = pool.map(load_client, [(base_url, token, seconds)] * CLIENTS)
+            elapsed = time.perf_counter() - start
+        return sum(counts) / elapsed
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    worker_counts = [int(n) for n in (sys.argv[1] if len(sys.argv) > 1 else "1,2,4").split(",")]
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "hospitals.idx")
+        build_synthetic_index(index_path)
+        env = {
+            **os.environ,
+            "USERS_DB_PATH": os.path.join(tmp, "users.db"),
+            "HOSPITAL_INDEX_PATH": index_path,
+            "GOOGLE_MAPS_API_KEY": "",
+            "GEMINI_API_KEY": "",
+            "GCP_PROJECT_ID": "",
+        }
+        token = make_token(env)
+
+        print(f"{os.cpu_count()} CPUs, {CLIENTS} load processes x {CONCURRENCY_PER_CLIENT} connections, {seconds:.0f}s per run")
+        baseline = None
+        for workers in worker_counts:
+            rps = measure(workers, seconds, env, token)
+            baseline = baseline or rps
+            print(f"{workers:3d} worker(s): {rps:8.0f} req/s  ({rps / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Local stand-ins for the app's upstreams, used by the load benchmarks.
+
+- upstream_app(): one ASGI app serving the Places Nearby Search, Distance
+  Matrix and Overpass endpoints with synthetic data around the requested
+  location. Run it as its own process (see main()) and point the backend at
+  it with GOOGLE_MAPS_BASE_URL / OVERPASS_URL.
+- FakeModel: the model client interface ModelGateway drives
+  (generate_content_async / stream_content_async), with configurable
+  latency, jitter and error injection.
+- FakeRedis: in-memory stand-in for the redis.asyncio commands the cache and
+  single-flight layers use, with key expiry.
+
+Latency is simulated with asyncio.sleep, so the stand-ins cost (almost) no
+CPU and the numbers reflect the backend's own overhead plus the configured
+waits.
+
+    python benchmarks/fakes.py --port 8765 --latency-ms 50 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+
+# =========================
+# FAKE UPSTREAM HTTP APIS
+# =========================
+FACILITIES_PER_RESPONSE = 40
+
+
+def _synthetic_places(lat: float, lon: float, n: int, seed: str):
+    """Deterministic facilities scattered within ~10 km of (lat, lon)."""
+    rng = random.Random(seed)
+    places = []
+    for i in range(n):
+        p_lat = lat + rng.uniform(-0.09, 0.09)
+        p_lon = lon + rng.uniform(-0.09, 0.09)
+        kind = "hospital" if i % 3 else "clinic"
+        places.append((f"Synthetic {kind.title()} {i}", p_lat, p_lon, kind))
+    return places
+
+
+def _haversine_m(lat1, lon1, lat2, lon2):
+    r = 6371000.0
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * r * math.asin(math.sqrt(a))
+
+
+def upstream_app(latency_ms: float = 50, jitter_ms: float = 20, error_rate: float = 0.0, seed: int = 0):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI()
+    rng = random.Random(seed)
+    app.state.calls = {"places": 0, "distance_matrix": 0, "overpass": 0}
+
+    async def simulate(name: str):
+        app.state.calls[name] += 1
+        await asyncio.sleep(max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000)
+        return rng.random() < error_rate
+
+    @app.get("/maps/api/place/nearbysearch/json")
+    async def places(location: str, keyword: str = "", type: str = "hospital"):
+        if await simulate("places"):
+            return {"status": "OVER_QUERY_LIMIT", "results": []}
+        lat, lon = (float(v) for v in location.split(","))
+        results = [{
+            "name": f"{name} ({keyword or type})",
+            "geometry": {"location": {"lat": p_lat, "lng": p_lon}},
+            "vicinity": "Synthetic Road",
+            "rating": round(3 + (i % 20) / 10, 1),
+            "types": [kind, "health"],
+        } for i, (name, p_lat, p_lon, kind) in enumerate(_synthetic_places(lat, lon, 20, location))]
+        return {"status": "OK", "results": results}
+
+    @app.get("/maps/api/distancematrix/json")
+    async def distance_matrix(origins: str, destinations: str):
+        if await simulate("distance_matrix"):
+            return {"status": "OVER_QUERY_LIMIT", "rows": []}
+        o_lat, o_lon = (float(v) for v in origins.split(","))
+        elements = []
+        for dest in destinations.split("|"):
+            d_lat, d_lon = (float(v) for v in dest.split(","))
+            meters = int(_haversine_m(o_lat, o_lon, d_lat, d_lon) * 1.3)  # roads are not straight
+            elements.append({"status": "OK", "distance": {"value": meters}})
+        return {"status": "OK", "rows": [{"elements": elements}]}
+
+    @app.post("/api/interpreter")
+    async def overpass(request: Request):
+        query = (await request.body()).decode()
+        if await simulate("overpass"):
+            return JSONResponse({"remark": "runtime error: simulated overload"}, status_code=429)
+        m = re.search(r"around:(\d+),([-\d.]+),([-\d.]+)", query)
+        lat, lon = (float(m.group(2)), float(m.group(3))) if m else (0.0, 0.0)
+        elements = [{
+            "type": "node", "id": i, "lat": p_lat, "lon": p_lon,
+            "tags": {"amenity": kind, "name": name, "addr:street": "Synthetic Road"},
+        } for i, (name, p_lat, p_lon, kind) in enumerate(_synthetic_places(lat, lon, FACILITIES_PER_RESPONSE, query))]
+        return {"elements": elements}
+
+    @app.get("/calls")
+    async def calls():
+        return app.state.calls
+
+    return app
+
+
+# =========================
+# FAKE MODEL
+# =========================
+class FakeModel:
+    """Returns a triage JSON after latency_ms (+/- jitter_ms).
+
+    error_rate: fraction of calls that raise; slow_rate: fraction of calls
+    that take slow_ms instead (to exercise the gateway deadline).
+    """
+
+    def __init__(self, latency_ms: float = 800, jitter_ms: float = 200, error_rate: float = 0.0,
+                 slow_rate: float = 0.0, slow_ms: float = 60000, chunks: int = 4, seed: int = 0):
+        self.latency_ms, self.jitter_ms = latency_ms, jitter_ms
+        self.error_rate, self.slow_rate, self.slow_ms = error_rate, slow_rate, slow_ms
+        self.chunks = chunks
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def _delay_s(self):
+        if self.rng.random() < self.slow_rate:
+            return self.slow_ms / 1000
+        return max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def _answer(self, prompt: str):
+        if self.rng.random() < self.error_rate:
+            raise RuntimeError("simulated model error")
+        mental = "Mental Health Expert" in prompt
+        return json.dumps({
+            "urgency": "Moderate",
+            "summary": "Synthetic assessment for benchmarking.",
+            "possible_conditions": ["Anxiety", "Stress"] if mental else ["Viral fever", "Common cold"],
+            "advice": ["Rest", "Stay hydrated", "See a doctor if symptoms persist"],
+            "specialist": "Psychiatrist" if mental else "General Physician",
+            "emergency": False,
+        })
+
+    async def generate_content_async(self, prompt: str):
+        self.calls += 1
+        await asyncio.sleep(self._delay_s())
+
+        class Resp:
+            def __init__(self, text):
+                self.text = text
+        return Resp(self._answer(prompt))
+
+    async def stream_content_async(self, prompt: str):
+        self.calls += 1
+        delay = self._delay_s() / self.chunks
+        text = self._answer(prompt)
+        size = math.ceil(len(text) / self.chunks)
+        for i in range(0, len(text), size):
+            await asyncio.sleep(delay)
+            yield text[i:i + size]
+
+
+# =========================
+# FAKE REDIS
+# =========================
+class FakeRedis:
+    """In-memory subset of redis.asyncio.Redis (decode_responses=True)."""
+
+    def __init__(self):
+        self._data = {}  # key -> (value, expires_at or None)
+
+    def _live(self, key):
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    async def ping(self):
+        return True
+
+    async def get(self, key):
+        item = self._live(key)
+        return item[0] if item else None
+
+    async def ttl(self, key):
+        item = self._live(key)
+        if item is None:
+            return -2
+        return -1 if item[1] is None else max(0, int(item[1] - time.monotonic()))
+
+    async def set(self, key, value, nx=False, px=None, ex=None):
+        if nx and self._live(key) is not None:
+            return None
+        ttl = px / 1000 if px else ex
+        self._data[key] = (str(value), time.monotonic() + ttl if ttl else None)
+        return True
+
+    async def setex(self, key, ttl, value):
+        return await self.set(key, value, ex=ttl)
+
+    async def delete(self, *keys):
+        return sum(self._data.pop(k, None) is not None for k in keys)
+
+    async def exists(self, *keys):
+        return sum(self._live(k) is not None for k in keys)
+
+    async def eval(self, script, numkeys, *args):
+        # Only the single-flight lock release script: delete KEYS[1] if it holds ARGV[1]
+        key, token = args[0], args[numkeys]
+        if await self.get(key) == token:
+            return await self.delete(key)
+        return 0
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    async def aclose(self):
+        pass
+
+
+class _FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self._redis = redis
+        self._calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self._calls.append((getattr(self._redis, name), args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        return [await fn(*args, **kwargs) for fn, args, kwargs in self._calls]
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve fake Places / Distance Matrix / Overpass APIs.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(
+        upstream_app(args.latency_ms, args.jitter_ms, args.error_rate),
+        host="127.0.0.1", port=args.port, log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
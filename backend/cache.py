@@ -0,0 +1,177 @@
+import os
+import time
+from collections import OrderedDict
+from config import logger
+from metrics import stage
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis-py too old or not installed: run local-only
+    aioredis = None
+
+LOCAL_MAX_ITEMS = int(os.getenv("CACHE_LOCAL_MAX_ITEMS", 2048))
+# Upper bound on how long a worker trusts its local copy of a Redis entry
+LOCAL_TTL = int(os.getenv("CACHE_LOCAL_TTL", 60))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+# After a Redis failure, skip Redis for this long before trying again
+REDIS_RETRY_S = float(os.getenv("REDIS_RETRY_S", 30))
+
+
+class LocalCache:
+    """Bounded in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_items: int = LOCAL_MAX_ITEMS):
+        self.max_items = max_items
+        self._data = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float):
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_items:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    """Async cache: in-process LRU in front of a pooled asyncio Redis client.
+
+    Redis is optional. If it is missing, unreachable, or starts failing, the
+    cache keeps serving from the local tier ("Degraded Mode") and retries
+    Redis after REDIS_RETRY_S.
+    """
+
+    def __init__(self, host: str, port: int, db: int = 0):
+        self.host, self.port, self.db = host, port, db
+        self.local = LocalCache()
+        self._client = None
+        self._down_until = 0.0
+        self.redis_ok = False
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+
+    @property
+    def redis(self):
+        """The asyncio Redis client, or None while running local-only."""
+        if self._client is None or time.monotonic() < self._down_until:
+            return None
+        return self._client
+
+    def _mark_down(self, e: Exception):
+        if self.redis_ok:
+            logger.warning(f"⚠️ Redis error ({e}). Running in 'Degraded Mode' for {REDIS_RETRY_S:.0f}s.")
+        self.redis_ok = False
+        self._down_until = time.monotonic() + REDIS_RETRY_S
+
+    async def connect(self):
+        """Creates this worker's connection pool and pings Redis."""
+        if self._client is None and aioredis is not None:
+            pool = aioredis.ConnectionPool(
+                host=self.host,
+                port=self.port,
+                db=self.db,
+                decode_responses=True,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                socket_connect_timeout=2,
+                socket_timeout=2,
+            )
+            self._client = aioredis.Redis(connection_pool=pool)
+        if self._client is None:
+            logger.warning("⚠️ redis.asyncio not available. Running in 'Degraded Mode' (Local Cache Only).")
+            return False
+        try:
+            await self._client.ping()
+            self.redis_ok = True
+            logger.info("✅ Redis connected successfully")
+        except Exception:
+            logger.warning("⚠️ Redis not found or connection timed out. Running in 'Degraded Mode' (Local Cache Only).")
+            self._down_until = time.monotonic() + REDIS_RETRY_S
+        return self.redis_ok
+
+    async def get(self, key: str):
+        value = self.local.get(key)
+        if value is not None:
+            self.hits_local += 1
+            return value
+
+        client = self.redis
+        if client is not None:
+            try:
+                with stage("redis"):
+                    value, ttl = await client.pipeline(transaction=False).get(key).ttl(key).execute()
+                self.redis_ok = True
+            except Exception as e:
+                self._mark_down(e)
+                value = None
+            if value is not None:
+                self.hits_redis += 1
+                if ttl and ttl > 0:
+                    self.local.set(key, value, min(ttl, LOCAL_TTL))
+                return value
+
+        self.misses += 1
+        return None
+
+    async def setex(self, key: str, ttl: int, value: str):
+        client = self.redis
+        # Without Redis the local tier is the only copy, so keep the full TTL
+        self.local.set(key, value, min(ttl, LOCAL_TTL) if client is not None else ttl)
+        if client is not None:
+            try:
+                with stage("redis"):
+                    await client.setex(key, ttl, value)
+                self.redis_ok = True
+            except Exception as e:
+                self._mark_down(e)
+
+    async def delete(self, key: str):
+        self.local.delete(key)
+        client = self.redis
+        if client is not None:
+            try:
+                await client.delete(key)
+            except Exception as e:
+                self._mark_down(e)
+
+    def stats(self):
+        lookups = self.hits_local + self.hits_redis + self.misses
+        return {
+            "redis": "connected" if self.redis_ok else "degraded",
+            "local_items": len(self.local),
+            "hits_local": self.hits_local,
+            "hits_redis": self.hits_redis,
+            "misses": self.misses,
+            "hit_rate": round((self.hits_local + self.hits_redis) / lookups, 4) if lookups else 0.0,
+        }
+
+    async def close(self):
+        if self._client is not None:
+            try:
+                await self._client.aclose()
+            except AttributeError:  # redis-py < 5
+                await self._client.close()
+            self._client = None
+            self.redis_ok = False
+
+
+# Shared cache instance; each worker connects to Redis from the app lifespan, not at import
+cache = TieredCache(
+    host=os.getenv("REDIS_HOST", "127.0.0.1"),
+    port=int(os.getenv("REDIS_PORT", 6379)),
+)
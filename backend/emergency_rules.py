@@ -0,0 +1,189 @@
+"""Rule-based emergency detection that runs before the AI call.
+
+The ruleset (data/emergency_rules.json) lists phrases per rule, grouped into
+`all_of` groups: a rule fires when every group has at least one phrase in the
+symptom text. All phrases of all rules are compiled into one token-level
+Aho-Corasick automaton, so a match is a single pass over the text regardless
+of ruleset size (microseconds for typical input). A phrase preceded by a
+negation in the same clause ("no chest pain", "no history of seizures") does
+not count; a clause ends at punctuation or at one of the ruleset's
+`clause_breaks` conjunctions ("no fever but chest pain"). Phrases like
+"don't know" are `pseudo_negations` and negate nothing.
+
+EMERGENCY_FAST_PATH selects what happens on a match:
+- "merge" (default): the rule triage is used right away (urgency High, the
+  emergency hospital search starts immediately) and the AI result, when it
+  arrives, only fills in the descriptive fields
+- "skip": the rule triage is final and the AI is not called
+- "off": rules are not evaluated
+"""
+
+import json
+import os
+import re
+import threading
+from collections import deque
+from config import logger
+
+EMERGENCY_FAST_PATH = os.getenv("EMERGENCY_FAST_PATH", "merge")
+RULES_PATH = os.getenv("EMERGENCY_RULES_PATH", os.path.join(os.path.dirname(__file__), "data", "emergency_rules.json"))
+# Punctuation is kept as a token of its own: it ends a negation's scope
+CLAUSE_PUNCTUATION = frozenset(".,;:!?")
+
+
+def tokenize(text: str):
+    return re.findall(r"[a-z0-9]+|[.,;:!?]", str(text).lower().replace("'", ""))
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton over token sequences."""
+
+    def __init__(self, phrases):
+        """phrases: iterable of (token tuple, payload)."""
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for tokens, payload in phrases:
+            state = 0
+            for token in tokens:
+                nxt = self._goto[state].get(token)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][token] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append((len(tokens), payload))
+
+        # Breadth-first failure links; outputs of the fallback state are inherited
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(token, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, tokens):
+        """Yields (start_index, payload) for every phrase occurrence."""
+        state = 0
+        for i, token in enumerate(tokens):
+            while state and token not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token, 0)
+            for length, payload in self._out[state]:
+                yield i - length + 1, payload
+
+
+class EmergencyRules:
+    def __init__(self, rules, negations=(), clause_breaks=(), pseudo_negations=()):
+        self.rules = rules
+        self.negations = frozenset(tokenize(" ".join(negations)))
+        self.clause_breaks = CLAUSE_PUNCTUATION | frozenset(tokenize(" ".join(clause_breaks)))
+        self.pseudo_negations = frozenset(tuple(tokenize(p)) for p in pseudo_negations)
+        self._pseudo_lengths = sorted({len(p) for p in self.pseudo_negations})
+        self.matcher = PhraseMatcher(
+            (tuple(tokenize(phrase)), (rule_i, group_i))
+            for rule_i, rule in enumerate(rules)
+            for group_i, group in enumerate(rule["all_of"])
+            for phrase in group
+        )
+        self.checks = 0
+        self.matches = 0
+
+    @classmethod
+    def load(cls, path: str = RULES_PATH):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["rules"], data.get("negations", ()), data.get("clause_breaks", ()), data.get("pseudo_negations", ()))
+
+    def _negated(self, tokens, start: int):
+        # Walk back to the start of the phrase's clause looking for a negation
+        for i in range(start - 1, -1, -1):
+            token = tokens[i]
+            if token in self.clause_breaks:
+                return False
+            if token in self.negations and not self._pseudo_negation(tokens, i):
+                return True
+        return False
+
+    def _pseudo_negation(self, tokens, i: int):
+        return any(tuple(tokens[i:i + n]) in self.pseudo_negations for n in self._pseudo_lengths)
+
+    def match(self, symptoms: str, mode: str):
+        """The first rule (in file order) fully matched by symptoms, or None."""
+        self.checks += 1
+        tokens = tokenize(symptoms)
+        satisfied = {}
+        for start, (rule_i, group_i) in self.matcher.find(tokens):
+            if mode in self.rules[rule_i]["modes"] and not self._negated(tokens, start):
+                satisfied.setdefault(rule_i, set()).add(group_i)
+        for rule_i in sorted(satisfied):
+            rule = self.rules[rule_i]
+            if len(satisfied[rule_i]) == len(rule["all_of"]):
+                self.matches += 1
+                return rule
+        return None
+
+    def stats(self):
+        return {"rules": len(self.rules), "checks": self.checks, "matches": self.matches}
+
+
+def rule_triage(rule):
+    """Full triage dict for a matched rule."""
+    triage = rule["triage"]
+    return {
+        "urgency": "High",
+        "summary": triage["summary"],
+        "possible_conditions": list(triage["possible_conditions"]),
+        "advice": list(triage["advice"]),
+        "specialist": triage["specialist"],
+        "emergency": True,
+    }
+
+
+def merge_triage(rule_dict: dict, ai_dict: dict):
+    """AI triage with the rule's urgency, emergency flag and specialist kept.
+
+    The hospital search already started for the rule's specialist, and an
+    emergency match is never downgraded by the model.
+    """
+    advice = list(rule_dict["advice"])
+    advice += [a for a in ai_dict.get("advice") or [] if a not in advice]
+    return {
+        **ai_dict,
+        "urgency": "High",
+        "emergency": True,
+        "specialist": rule_dict["specialist"],
+        "summary": ai_dict.get("summary") or rule_dict["summary"],
+        "possible_conditions": ai_dict.get("possible_conditions") or rule_dict["possible_conditions"],
+        "advice": advice,
+    }
+
+
+_rules = None
+_rules_checked = False
+_rules_lock = threading.Lock()
+
+def get_emergency_rules():
+    """Loads the ruleset on first use; None when disabled or unavailable.
+
+    Callers that arrive while the warmup thread is loading wait for it
+    (a few ms) instead of skipping the fast path.
+    """
+    global _rules, _rules_checked
+    if not _rules_checked:
+        with _rules_lock:
+            if not _rules_checked:
+                if EMERGENCY_FAST_PATH != "off":
+                    try:
+                        _rules = EmergencyRules.load()
+                        logger.info(f"🚑 Emergency rules loaded: {len(_rules.rules)} rules from {RULES_PATH}")
+                    except Exception as e:
+                        logger.error(f"❌ Failed to load emergency rules {RULES_PATH}: {e}")
+                _rules_checked = True
+    return _rules
@@ -0,0 +1,356 @@
+"""Offline spatial index of hospitals and clinics.
+
+The index is built once from an OSM extract (.osm XML) or an Overpass JSON
+dump and written to a single binary file that is memory-mapped at runtime:
+
+    header | cell keys (int64) | cell offsets (uint32) | lats | lons (float64)
+           | metadata offsets (uint64) | metadata blob (JSON lines)
+
+Facilities are bucketed into a fixed lat/lon grid and sorted by cell, so a
+k-nearest query only touches the few cells around the user. Overpass is no
+longer needed on the request path; `refresh_loop` can rebuild the file in the
+background from a bounding-box query. With several workers, one of them
+(elected with a file lock) rebuilds and the others reopen the file when it
+changes.
+
+Build from the command line:
+    python hospital_index.py build dump.json hospitals.idx
+    python hospital_index.py query hospitals.idx 12.84 80.15
+"""
+
+import asyncio
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from config import logger
+from utils import calculate_distance
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so every worker refreshes (each into its own temp file)
+    fcntl = None
+
+INDEX_PATH = os.getenv("HOSPITAL_INDEX_PATH", os.path.join(os.path.dirname(__file__), "data", "hospitals.idx"))
+# Optional background refresh from Overpass: "south,west,north,east"
+REFRESH_BBOX = os.getenv("HOSPITAL_INDEX_REFRESH_BBOX")
+REFRESH_HOURS = float(os.getenv("HOSPITAL_INDEX_REFRESH_HOURS", 24))
+# How often each worker checks whether the index file was replaced
+RECHECK_S = float(os.getenv("HOSPITAL_INDEX_RECHECK_S", 30))
+OVERPASS_URL = os.getenv("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+
+CELL_DEG = 0.05  # ~5.5 km of latitude per grid cell
+AMENITIES = ("hospital", "clinic")
+
+_MAGIC = b"HIDX"
+_VERSION = 1
+# magic, version, cell_deg, count, ncells, meta_blob_len
+_HEADER = struct.Struct("<4sIdIIQ")
+_KM_PER_DEG = 111.195
+
+
+def _cell(lat: float, lon: float, cell_deg: float):
+    return int((lat + 90.0) // cell_deg), int((lon + 180.0) // cell_deg)
+
+
+def _cell_key(row: int, col: int, cell_deg: float):
+    ncols = int(math.ceil(360.0 / cell_deg))
+    return row * ncols + (col % ncols)
+
+
+def _facility(lat, lon, tags):
+    if tags.get("amenity") not in AMENITIES and tags.get("healthcare") not in AMENITIES:
+        return None
+    return {
+        "lat": float(lat),
+        "lon": float(lon),
+        "name": tags.get("name", "Unknown"),
+        "address": tags.get("addr:full") or tags.get("addr:street") or "Nearby",
+        "amenity": tags.get("amenity") or tags.get("healthcare"),
+    }
+
+
+def load_overpass_json(data: dict):
+    facilities = []
+    for el in data.get("elements", []):
+        p_lat = el.get("lat") or (el.get("center") or {}).get("lat")
+        p_lon = el.get("lon") or (el.get("center") or {}).get("lon")
+        if not p_lat or not p_lon:
+            continue
+        fac = _facility(p_lat, p_lon, el.get("tags", {}))
+        if fac:
+            facilities.append(fac)
+    return facilities
+
+
+def load_osm_xml(path: str):
+    """Streams nodes out of an .osm XML extract (ways/relations are skipped)."""
+    facilities = []
+    for _, elem in ET.iterparse(path, events=("end",)):
+        if elem.tag == "node":
+            tags = {t.get("k"): t.get("v") for t in elem.findall("tag")}
+            if tags:
+                fac = _facility(elem.get("lat"), elem.get("lon"), tags)
+                if fac:
+                    facilities.append(fac)
+        if elem.tag in ("node", "way", "relation"):
+            elem.clear()
+    return facilities
+
+
+def load_source(path: str):
+    if path.endswith(".osm") or path.endswith(".xml"):
+        return load_osm_xml(path)
+    with open(path, encoding="utf-8") as f:
+        return load_overpass_json(json.load(f))
+
+
+def build_index(facilities, out_path: str, cell_deg: float = CELL_DEG):
+    """Writes facilities to a grid-sorted index file (atomically replaced)."""
+    keyed = sorted(
+        ((_cell_key(*_cell(f["lat"], f["lon"], cell_deg), cell_deg), f) for f in facilities),
+        key=lambda kf: kf[0],
+    )
+
+    keys, offsets = array("q"), array("I")
+    lats, lons, meta_offsets = array("d"), array("d"), array("Q")
+    blob = bytearray()
+    for i, (key, f) in enumerate(keyed):
+        if not keys or keys[-1] != key:
+            keys.append(key)
+            offsets.append(i)
+        lats.append(f["lat"])
+        lons.append(f["lon"])
+        meta_offsets.append(len(blob))
+        blob += json.dumps([f["name"], f["address"], f["amenity"]], ensure_ascii=False).encode() + b"\n"
+    offsets.append(len(keyed))
+    meta_offsets.append(len(blob))
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    # Per-process temp file: concurrent builders never interleave writes
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, cell_deg, len(keyed), len(keys), len(blob)))
+        for arr in (keys, offsets, lats, lons, meta_offsets):
+            if sys.byteorder != "little":
+                arr.byteswap()
+            f.write(arr.tobytes())
+        f.write(blob)
+    os.replace(tmp_path, out_path)
+    return len(keyed)
+
+
+class HospitalIndex:
+    """Read-only, memory-mapped view of an index file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.cell_deg, self.count, ncells, blob_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a hospital index (v{_VERSION})")
+        if sys.byteorder != "little":
+            raise ValueError("Hospital index files are little-endian only")
+
+        view = memoryview(self._mm)
+        pos = _HEADER.size
+
+        def take(fmt, n, size):
+            nonlocal pos
+            part = view[pos:pos + n * size].cast(fmt)
+            pos += n * size
+            return part
+
+        self._keys = take("q", ncells, 8)
+        self._offsets = take("I", ncells + 1, 4)
+        self._lats = take("d", self.count, 8)
+        self._lons = take("d", self.count, 8)
+        self._meta_offsets = take("Q", self.count + 1, 8)
+        self._blob_start = pos
+        self._ncols = int(math.ceil(360.0 / self.cell_deg))
+        # Extent of the extract, to tell "no facility nearby" from "not covered"
+        if self.count:
+            self.bbox = (min(self._lats), min(self._lons), max(self._lats), max(self._lons))
+        else:
+            self.bbox = None
+
+    def covers(self, lat: float, lon: float):
+        """True when (lat, lon) lies inside the extract's bounding box."""
+        if self.bbox is None:
+            return False
+        south, west, north, east = self.bbox
+        return south <= lat <= north and west <= lon <= east
+
+    def _cell_range(self, key: int):
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return self._offsets[i], self._offsets[i + 1]
+        return 0, 0
+
+    def nearest(self, lat: float, lon: float, k: int = 8, max_km: float = 15.0):
+        """Returns up to k (distance_km, record_id) pairs, nearest first."""
+        row, col = _cell(lat, lon, self.cell_deg)
+        # Cells shrink east-west towards the poles; use the narrowest edge
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + self.cell_deg, 89.9))), 1e-6)
+        cell_km = self.cell_deg * _KM_PER_DEG * cos_lat
+        max_ring = int(max_km / cell_km) + 1
+
+        best = []  # max-heap of (-dist, id), capped at k
+        for ring in range(max_ring + 1):
+            # Every point in this ring is at least (ring - 1) cells away
+            if len(best) == k and (ring - 1) * cell_km > -best[0][0]:
+                break
+            for r in range(row - ring, row + ring + 1):
+                edge = abs(r - row) == ring
+                cols = range(col - ring, col + ring + 1) if edge else (col - ring, col + ring)
+                for c in cols:
+                    start, end = self._cell_range(r * self._ncols + (c % self._ncols))
+                    for i in range(start, end):
+                        d = calculate_distance(lat, lon, self._lats[i], self._lons[i])
+                        if d > max_km:
+                            continue
+                        if len(best) < k:
+                            heapq.heappush(best, (-d, i))
+                        elif d < -best[0][0]:
+                            heapq.heapreplace(best, (-d, i))
+        return sorted((-nd, i) for nd, i in best)
+
+    def record(self, i: int):
+        start = self._blob_start + self._meta_offsets[i]
+        end = self._blob_start + self._meta_offsets[i + 1]
+        name, address, amenity = json.loads(self._mm[start:end])
+        return {
+            "name": name,
+            "lat": self._lats[i],
+            "lon": self._lons[i],
+            "address": address,
+            "amenity": amenity,
+        }
+
+    def close(self):
+        for part in (self._keys, self._offsets, self._lats, self._lons, self._meta_offsets):
+            part.release()
+        self._mm.close()
+        self._file.close()
+
+
+_index = None
+_index_sig = None  # (inode, mtime) of the file _index was opened from
+_index_checked_at = None  # monotonic time of the last file check; None until the first one finishes
+_index_lock = threading.Lock()
+
+
+def _file_sig():
+    try:
+        st = os.stat(INDEX_PATH)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+def _reopen_if_changed(force: bool = False):
+    global _index, _index_sig, _index_checked_at
+    with _index_lock:
+        if not force and _index_checked_at is not None and time.monotonic() - _index_checked_at < RECHECK_S:
+            return  # another caller checked while we waited for the lock
+        sig = _file_sig()
+        if sig is not None and sig != _index_sig:
+            try:
+                # Readers may still hold the old index; its mapping is released
+                # when the last reference goes away
+                _index, _index_sig = HospitalIndex(INDEX_PATH), sig
+                logger.info(f"🏥 Hospital index loaded: {_index.count} facilities from {INDEX_PATH}")
+            except Exception as e:
+                logger.error(f"❌ Failed to open hospital index {INDEX_PATH}: {e}")
+        _index_checked_at = time.monotonic()
+
+
+def get_hospital_index():
+    """The open index, or None when no index file is available.
+
+    The file is re-checked at most every RECHECK_S and reopened when it was
+    replaced, so every worker picks up a refresh done by another one.
+    Callers that arrive while the warmup thread is opening it wait for it
+    instead of falling back to Overpass.
+    """
+    if _index_checked_at is None or time.monotonic() - _index_checked_at >= RECHECK_S:
+        _reopen_if_changed()
+    return _index
+
+
+async def refresh_from_overpass(http_client, bbox: str = None):
+    """Rebuilds the index from an Overpass bounding-box query and swaps it in."""
+    south, west, north, east = (float(v) for v in (bbox or REFRESH_BBOX).split(","))
+    area = f"({south},{west},{north},{east})"
+    query = "[out:json][timeout:180];(" + "".join(
+        f'node["amenity"="{a}"]{area};way["amenity"="{a}"]{area};' for a in AMENITIES
+    ) + ");out center tags;"
+    resp = await http_client.post(OVERPASS_URL, content=query, headers={"Content-Type": "text/plain"}, timeout=300)
+    facilities = load_overpass_json(resp.json())
+    count = await asyncio.to_thread(build_index, facilities, INDEX_PATH)
+    _reopen_if_changed(force=True)
+    logger.info(f"🏥 Hospital index refreshed from Overpass: {count} facilities")
+
+
+@contextmanager
+def _refresh_leader():
+    """Yields True in the one process on this host that holds the refresh lock."""
+    if fcntl is None:
+        yield True
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(INDEX_PATH)), exist_ok=True)
+    with open(INDEX_PATH + ".lock", "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _index_is_stale():
+    if not os.path.exists(INDEX_PATH):
+        return True
+    return time.time() - os.path.getmtime(INDEX_PATH) > REFRESH_HOURS * 3600
+
+
+async def refresh_loop(http_client):
+    """Background task: keeps the index fresh when a refresh bbox is configured."""
+    if not REFRESH_BBOX:
+        return
+    while True:
+        try:
+            if _index_is_stale():
+                # One worker rebuilds; the others reopen the new file in get_hospital_index()
+                with _refresh_leader() as leader:
+                    if leader and _index_is_stale():
+                        await refresh_from_overpass(http_client)
+        except Exception as e:
+            logger.error(f"Hospital index refresh failed: {e}")
+        await asyncio.sleep(min(REFRESH_HOURS * 3600, 3600))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "build":
+        n = build_index(load_source(sys.argv[2]), sys.argv[3])
+        print(f"Indexed {n} facilities into {sys.argv[3]}")
+    elif len(sys.argv) == 5 and sys.argv[1] == "query":
+        idx = HospitalIndex(sys.argv[2])
+        for dist, i in idx.nearest(float(sys.argv[3]), float(sys.argv[4])):
+            print(f"{dist:7.2f} km  {idx.record(i)['name']}")
+    else:
+        print(__doc__)
+        sys.exit(1)
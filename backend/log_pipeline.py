@@ -0,0 +1,193 @@
+"""Non-blocking logging: records are queued on the caller's thread and
+formatted and written by a background listener thread.
+
+setup_logging() installs a QueueHandler on the root logger (and on uvicorn's
+access logger), so a log call on the event loop costs one getMessage(), a
+length cap and a put_nowait(). The queue is bounded: when the writer falls
+behind, records are dropped and counted instead of blocking requests.
+
+Records are plain text by default or one JSON object per line with
+LOG_FORMAT=json. Structured fields go in `extra={"fields": {...}}` and are
+emitted as JSON keys (or `key=value` suffixes in text mode).
+
+Raw model output is logged through log_payload(), which samples
+(LOG_AI_PAYLOAD_SAMPLE_RATE), rate limits per category
+(LOG_AI_PAYLOAD_PER_MIN) and truncates (LOG_AI_PAYLOAD_MAX_CHARS) before
+anything is queued. Suppressed payloads are counted and the count is
+attached to the next payload logged in that category.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Hard cap on any single message
+LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", 8000))
+LOG_AI_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_AI_PAYLOAD_SAMPLE_RATE", 1.0))
+LOG_AI_PAYLOAD_PER_MIN = float(os.getenv("LOG_AI_PAYLOAD_PER_MIN", 60))
+LOG_AI_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_AI_PAYLOAD_MAX_CHARS", 1000))
+# Unparseable model output is worth more of the text
+LOG_AI_PARSE_FAILURE_MAX_CHARS = int(os.getenv("LOG_AI_PARSE_FAILURE_MAX_CHARS", 4000))
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def _truncate(text: str, max_chars: int):
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [{len(text) - max_chars} chars truncated]"
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks and leaves formatting to the listener."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve args now (they may be mutated after the call returns) but
+        # keep exc_info: the listener formats tracebacks off the hot path
+        msg = _truncate(record.getMessage(), LOG_MAX_CHARS)
+        record.msg, record.args, record.message = msg, None, msg
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return text
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_handler = None
+_listener = None
+
+def setup_logging():
+    """Routes all logging through the queue; safe to call more than once."""
+    global _handler, _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler()
+    output.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else TextFormatter(TEXT_FORMAT))
+
+    _handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _listener = QueueListener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(lambda: _listener.stop())
+    # Threads do not survive fork (gunicorn --preload): give each child its own writer
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_restart_listener)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+
+    # uvicorn configures its access logger (one record per request) before
+    # importing the app; send it through the queue as well
+    access = logging.getLogger("uvicorn.access")
+    if access.handlers:
+        for handler in list(access.handlers):
+            access.removeHandler(handler)
+        access.addHandler(_handler)
+
+def _restart_listener():
+    global _listener
+    _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = QueueListener(_handler.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+# =========================
+# SAMPLED PAYLOAD LOGGING
+# =========================
+class _Bucket:
+    """Token bucket refilled at LOG_AI_PAYLOAD_PER_MIN per minute, bursting up to the same amount."""
+
+    __slots__ = ("tokens", "updated", "pending", "suppressed", "logged")
+
+    def __init__(self, capacity: float):
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.pending = 0  # suppressed since the last logged payload
+        self.suppressed = 0
+        self.logged = 0
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def _allow(category: str):
+    with _buckets_lock:
+        bucket = _buckets.get(category)
+        if bucket is None:
+            bucket = _buckets[category] = _Bucket(LOG_AI_PAYLOAD_PER_MIN)
+        now = time.monotonic()
+        bucket.tokens = min(LOG_AI_PAYLOAD_PER_MIN, bucket.tokens + (now - bucket.updated) * LOG_AI_PAYLOAD_PER_MIN / 60)
+        bucket.updated = now
+        if bucket.tokens < 1 or random.random() >= LOG_AI_PAYLOAD_SAMPLE_RATE:
+            bucket.pending += 1
+            bucket.suppressed += 1
+            return None
+        bucket.tokens -= 1
+        bucket.logged += 1
+        pending, bucket.pending = bucket.pending, 0
+        return pending
+
+
+def log_payload(logger, category: str, text: str, level: int = logging.INFO, max_chars: int = None, **fields):
+    """Logs a large payload (e.g. raw model output) if sampling and the rate limit allow it."""
+    if not logger.isEnabledFor(level):
+        return
+    suppressed = _allow(category)
+    if suppressed is None:
+        return
+    text = str(text)
+    fields = {"category": category, "chars": len(text), **fields}
+    if suppressed:
+        fields["suppressed_since_last"] = suppressed
+    logger.log(level, f"{category}: {_truncate(text, max_chars or LOG_AI_PAYLOAD_MAX_CHARS)}", extra={"fields": fields})
+
+
+def stats():
+    with _buckets_lock:
+        payloads = {name: {"logged": b.logged, "suppressed": b.suppressed} for name, b in _buckets.items()}
+    return {
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+        "payloads": payloads,
+    }
@@ -1,37 +1,133 @@
  
 
 import os
-import httpx
 import re
-import asyncio  
 from utils import calculate_distance
+from ranking import rank_nearest, haversine_many
+from cache import LocalCache
+from hospital_index import get_hospital_index
+from config import logger
+from upstream import Upstream
 
-http_client = httpx.AsyncClient(timeout=httpx.Timeout(20.0))
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+# Upstream endpoints are overridable so benchmarks can point them at local stand-ins
+GOOGLE_MAPS_BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com").rstrip("/")
+DISTANCE_MATRIX_URL = f"{GOOGLE_MAPS_BASE_URL}/maps/api/distancematrix/json"
+PLACES_URL = f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/nearbysearch/json"
+OVERPASS_URL = os.getenv("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+# Alternate Overpass instances for hedged requests and failover, comma-separated.
+# None by default: hedging duplicates queries, so only list instances whose
+# usage policy allows the extra load, e.g.
+#   OVERPASS_MIRRORS=https://overpass.kumi.systems/api/interpreter
+OVERPASS_MIRRORS = [u.strip() for u in os.getenv("OVERPASS_MIRRORS", "").split(",") if u.strip()]
+
+# Whole-call deadlines per endpoint (including any hedged or failover attempt)
+places_api = Upstream("places", [PLACES_URL], float(os.getenv("PLACES_TIMEOUT_S", 5)))
+distance_matrix_api = Upstream("distance_matrix", [DISTANCE_MATRIX_URL], float(os.getenv("DISTANCE_MATRIX_TIMEOUT_S", 4)))
+overpass_api = Upstream("overpass", [OVERPASS_URL] + OVERPASS_MIRRORS, float(os.getenv("OVERPASS_TIMEOUT_S", 10)))
+
+def upstream_stats():
+    return {api.name: api.stats() for api in (places_api, distance_matrix_api, overpass_api)}
+
+# Distance Matrix accepts up to 25 destinations per origin in one request
+DISTANCE_MATRIX_MAX_DESTINATIONS = 25
+DISTANCE_CACHE_TTL = int(os.getenv("DISTANCE_CACHE_TTL", 86400))
+_distance_cache = LocalCache(max_items=int(os.getenv("DISTANCE_CACHE_MAX_ITEMS", 20000)))
+
+def _distance_key(origin_lat, origin_lon, dest_lat, dest_lon):
+    # Origins are bucketed to ~100 m cells so nearby users share entries
+    return f"{round(origin_lat, 3)},{round(origin_lon, 3)}>{round(dest_lat, 5)},{round(dest_lon, 5)}"
+
+async def get_driving_distances(origin_lat, origin_lon, destinations):
+    """Road distances (km) from one origin to many (lat, lon) destinations.
+
+    Cached pairs are served locally; the rest are resolved with a single
+    Distance Matrix request per 25 destinations. Any element the API cannot
+    route falls back to the straight-line distance.
+    """
+    distances = [_distance_cache.get(_distance_key(origin_lat, origin_lon, d_lat, d_lon)) for d_lat, d_lon in destinations]
+    missing = [i for i, d in enumerate(distances) if d is None]
+
+    if GOOGLE_MAPS_API_KEY and missing:
+        for chunk_start in range(0, len(missing), DISTANCE_MATRIX_MAX_DESTINATIONS):
+            chunk = missing[chunk_start:chunk_start + DISTANCE_MATRIX_MAX_DESTINATIONS]
+            try:
+                params = {
+                    "origins": f"{origin_lat},{origin_lon}",
+                    "destinations": "|".join(f"{destinations[i][0]},{destinations[i][1]}" for i in chunk),
+                    "key": GOOGLE_MAPS_API_KEY
+                }
+                resp = await distance_matrix_api.request("GET", params=params)
+                data = resp.json()
+                if data["status"] != "OK":
+                    continue
+                for i, element in zip(chunk, data["rows"][0]["elements"]):
+                    if element["status"] == "OK":
+                        km = round(element["distance"]["value"] / 1000, 2)
+                        distances[i] = km
+                        d_lat, d_lon = destinations[i]
+                        _distance_cache.set(_distance_key(origin_lat, origin_lon, d_lat, d_lon), km, DISTANCE_CACHE_TTL)
+            except Exception as e:
+                logger.warning(f"⚠️ Distance Matrix error: {e}")
+
+    for i in missing:
+        if distances[i] is None:
+            d_lat, d_lon = destinations[i]
+            distances[i] = calculate_distance(origin_lat, origin_lon, d_lat, d_lon)
+    return distances
 
 async def get_real_driving_distance(origin_lat, origin_lon, dest_lat, dest_lon):
     """Calculates road distance via Google Distance Matrix API."""
-    if not GOOGLE_MAPS_API_KEY: return calculate_distance(origin_lat, origin_lon, dest_lat, dest_lon)
-    try:
-        url = "https://maps.googleapis.com/maps/api/distancematrix/json"
-        params = {
-            "origins": f"{origin_lat},{origin_lon}",
-            "destinations": f"{dest_lat},{dest_lon}",
-            "key": GOOGLE_MAPS_API_KEY
-        }
-        resp = await http_client.get(url, params=params)
-        data = resp.json()
-        if data["status"] == "OK" and data["rows"][0]["elements"][0]["status"] == "OK":
-            return round(data["rows"][0]["elements"][0]["distance"]["value"] / 1000, 2)
-    except: pass
-    return calculate_distance(origin_lat, origin_lon, dest_lat, dest_lon)
+    return (await get_driving_distances(origin_lat, origin_lon, [(dest_lat, dest_lon)]))[0]
+
+SEARCH_RADIUS_M = 15000
+
+def resolve_origin(lat: float, lon: float):
+    if lat == 0 or lon == 0:
+        # Precision Fallback for VIT Chennai area
+        return 12.8407, 80.1534
+    return lat, lon
+
+def _google_maps_url(curr_lat, curr_lon, p_lat, p_lon):
+    return f"https://www.google.com/maps/dir/?api=1&origin={curr_lat},{curr_lon}&destination={p_lat},{p_lon}&travelmode=driving"
+
+def _osm_maps_url(curr_lat, curr_lon, p_lat, p_lon):
+    return f"https://www.openstreetmap.org/directions?engine=fossgis_osrm_car&route={curr_lat}%2C{curr_lon}%3B{p_lat}%2C{p_lon}"
+
+async def _fetch_overpass(curr_lat, curr_lon, radius=SEARCH_RADIUS_M):
+    """Returns (elements, lats, lons) for hospitals/clinics within radius meters."""
+    query = f"""
+    [out:json];
+    (
+      node["amenity"="hospital"](around:{radius},{curr_lat},{curr_lon});
+      node["amenity"="clinic"](around:{radius},{curr_lat},{curr_lon});
+    );
+    out center tags;
+    """
+    resp = await overpass_api.request("POST", content=query, headers={"Content-Type":"text/plain"})
+    data = resp.json()
+    elements, lats, lons = [], [], []
+    for el in data.get("elements", []):
+        p_lat = el.get("lat") or (el.get("center") or {}).get("lat")
+        p_lon = el.get("lon") or (el.get("center") or {}).get("lon")
+        if not p_lat or not p_lon: continue
+        elements.append(el)
+        lats.append(p_lat)
+        lons.append(p_lon)
+    return elements, lats, lons
+
+def _index_nearest(lat: float, lon: float, k: int, max_km: float):
+    """(index, hits) from the offline index. hits is [] when there is no index,
+    the point lies outside the extract, or nothing is within max_km; callers
+    then fall through to Overpass."""
+    index = get_hospital_index()
+    if index is None or not index.covers(lat, lon):
+        return index, []
+    return index, index.nearest(lat, lon, k=k, max_km=max_km)
 
 async def get_nearby_hospitals(lat: float, lon: float, specialist: str, urgency: str):
     # 1. Capture Dynamic Location
-    curr_lat, curr_lon = lat, lon
-    if curr_lat == 0 or curr_lon == 0:
-        # Precision Fallback for VIT Chennai area
-        curr_lat, curr_lon = 12.8407, 80.1534 
+    curr_lat, curr_lon = resolve_origin(lat, lon)
 
     clean_spec = re.sub(r"[\[\]']", "", str(specialist))
 
@@ -54,18 +150,17 @@ async def get_nearby_hospitals(lat: float, lon: float, specialist: str, urgency:
         }
 
         try:
-            endpoint = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-            resp = await http_client.get(endpoint, params=params)
+            resp = await places_api.request("GET", params=params)
             places = resp.json().get("results", [])
 
-            # Parallel distance calculation for speed
-            tasks = [get_real_driving_distance(curr_lat, curr_lon, p["geometry"]["location"]["lat"], p["geometry"]["location"]["lng"]) for p in places[:10]]
-            distances = await asyncio.gather(*tasks)
+            # One batched Distance Matrix call for all candidates
+            destinations = [(p["geometry"]["location"]["lat"], p["geometry"]["location"]["lng"]) for p in places[:10]]
+            distances = await get_driving_distances(curr_lat, curr_lon, destinations)
 
             results = []
             for i, p in enumerate(places[:10]):
                 p_lat, p_lon = p["geometry"]["location"]["lat"], p["geometry"]["location"]["lng"]
-                m_url = f"https://www.google.com/maps/dir/?api=1&origin={curr_lat},{curr_lon}&destination={p_lat},{p_lon}&travelmode=driving"
+                m_url = _google_maps_url(curr_lat, curr_lon, p_lat, p_lon)
                 results.append({
                     "name": p.get("name"),
                     "lat": p_lat, "lon": p_lon,
@@ -77,30 +172,38 @@ async def get_nearby_hospitals(lat: float, lon: float, specialist: str, urgency:
                 })
             return sorted(results, key=lambda x: x["distance_km"])[:8]
         except Exception as e:
-            print(f"Google Places Error: {e}")
+            logger.warning(f"⚠️ Google Places error: {e}")
 
-    # Fallback: Use OpenStreetMap Overpass API (no API key required)
+    # Fallback 1: Local offline index (no network on the request path)
+    index, nearest = _index_nearest(curr_lat, curr_lon, k=8, max_km=15.0)
+    if nearest:
+        results = []
+        for dist, i in nearest:
+            rec = index.record(i)
+            p_lat, p_lon = rec["lat"], rec["lon"]
+            m_url = _osm_maps_url(curr_lat, curr_lon, p_lat, p_lon)
+            results.append({
+                "name": rec["name"],
+                "lat": p_lat,
+                "lon": p_lon,
+                "address": rec["address"],
+                "rating": 0.0,
+                "maps_url": m_url,
+                "distance_km": dist,
+                "available_specialist": clean_spec
+            })
+        return results
+
+    # Fallback 2: Use OpenStreetMap Overpass API (no API key required)
     try:
-        overpass_url = "https://overpass-api.de/api/interpreter"
-        # radius in meters
-        radius = 15000
-        query = f"""
-        [out:json];
-        (
-          node["amenity"="hospital"](around:{radius},{curr_lat},{curr_lon});
-          node["amenity"="clinic"](around:{radius},{curr_lat},{curr_lon});
-        );
-        out center tags;
-        """
-        resp = await http_client.post(overpass_url, content=query, headers={"Content-Type":"text/plain"})
-        data = resp.json()
+        radius = SEARCH_RADIUS_M
+        elements, lats, lons = await _fetch_overpass(curr_lat, curr_lon, radius)
+
+        # Rank every returned facility, not just the first few, in one vectorized pass
         results = []
-        for el in data.get("elements", [])[:20]:
-            p_lat = el.get("lat") or (el.get("center") or {}).get("lat")
-            p_lon = el.get("lon") or (el.get("center") or {}).get("lon")
-            if not p_lat or not p_lon: continue
-            dist = calculate_distance(curr_lat, curr_lon, p_lat, p_lon)
-            m_url = f"https://www.openstreetmap.org/directions?engine=fossgis_osrm_car&route={curr_lat}%2C{curr_lon}%3B{p_lat}%2C{p_lon}"
+        for dist, i in rank_nearest(curr_lat, curr_lon, lats, lons, k=8, max_km=radius / 1000):
+            el, p_lat, p_lon = elements[i], lats[i], lons[i]
+            m_url = _osm_maps_url(curr_lat, curr_lon, p_lat, p_lon)
             name = el.get("tags", {}).get("name", "Unknown")
             results.append({
                 "name": name,
@@ -109,10 +212,142 @@ async def get_nearby_hospitals(lat: float, lon: float, specialist: str, urgency:
                 "address": el.get("tags", {}).get("addr:full") or el.get("tags", {}).get("addr:street") or "Nearby",
                 "rating": 0.0,
                 "maps_url": m_url,
-                "distance_km": round(dist, 2),
+                "distance_km": dist,
                 "available_specialist": clean_spec
             })
-        return sorted(results, key=lambda x: x["distance_km"])[:8]
+        return results
     except Exception as e:
-        print(f"Overpass Error: {e}")
-        return []
\ No newline at end of file
+        logger.warning(f"⚠️ Overpass error: {e}")
+        return []
+
+# =========================
+# SPECULATIVE PREFETCH
+# =========================
+# Used when the location is known before the triage: fetch_candidates runs
+# concurrently with the AI call, refine_candidates narrows it afterwards.
+MIN_REFINED_CANDIDATES = 3
+_GENERIC_SPECIALISTS = {"", "general physician", "general practitioner", "doctor", "physician"}
+
+async def fetch_candidates(lat: float, lon: float):
+    """Generic nearby-facility search that does not depend on the triage result."""
+    curr_lat, curr_lon = resolve_origin(lat, lon)
+
+    if GOOGLE_MAPS_API_KEY:
+        params = {
+            "location": f"{curr_lat},{curr_lon}",
+            "type": "hospital",
+            "rankby": "distance",
+            "key": GOOGLE_MAPS_API_KEY
+        }
+        try:
+            resp = await places_api.request("GET", params=params)
+            return [{
+                "name": p.get("name"),
+                "lat": p["geometry"]["location"]["lat"],
+                "lon": p["geometry"]["location"]["lng"],
+                "address": p.get("vicinity", "Nearby"),
+                "rating": float(p.get("rating", 0.0)),
+                "types": p.get("types", []),
+                "source": "google"
+            } for p in resp.json().get("results", [])]
+        except Exception as e:
+            logger.warning(f"⚠️ Google Places error: {e}")
+
+    index, nearest = _index_nearest(curr_lat, curr_lon, k=40, max_km=SEARCH_RADIUS_M / 1000)
+    if nearest:
+        candidates = []
+        for _, i in nearest:
+            rec = index.record(i)
+            candidates.append({
+                "name": rec["name"], "lat": rec["lat"], "lon": rec["lon"],
+                "address": rec["address"], "rating": 0.0,
+                "types": [rec["amenity"]], "source": "osm"
+            })
+        return candidates
+
+    try:
+        elements, lats, lons = await _fetch_overpass(curr_lat, curr_lon)
+        return [{
+            "name": el.get("tags", {}).get("name", "Unknown"),
+            "lat": p_lat, "lon": p_lon,
+            "address": el.get("tags", {}).get("addr:full") or el.get("tags", {}).get("addr:street") or "Nearby",
+            "rating": 0.0,
+            "types": [el.get("tags", {}).get("amenity", "")],
+            "source": "osm"
+        } for el, p_lat, p_lon in zip(elements, lats, lons)]
+    except Exception as e:
+        logger.warning(f"⚠️ Overpass error: {e}")
+        return []
+
+def _matches_specialist(candidate, clean_spec: str):
+    words = [w for w in re.findall(r"[a-z]+", clean_spec.lower()) if len(w) > 3]
+    name = (candidate.get("name") or "").lower()
+    return any(w[:6] in name for w in words)
+
+async def refine_candidates(candidates, lat: float, lon: float, specialist: str, urgency: str):
+    """Ranks a prefetched candidate set for the triage's specialist and urgency."""
+    curr_lat, curr_lon = resolve_origin(lat, lon)
+    clean_spec = re.sub(r"[\[\]']", "", str(specialist))
+
+    pool = candidates
+    if urgency.lower() == "high":
+        hospitals_only = [c for c in pool if "hospital" in c["types"]]
+        pool = hospitals_only or pool
+    if clean_spec.lower().strip() not in _GENERIC_SPECIALISTS:
+        # Prefer facilities named after the specialty when there are enough of them
+        specialised = [c for c in pool if _matches_specialist(c, clean_spec)]
+        if len(specialised) >= MIN_REFINED_CANDIDATES:
+            pool = specialised
+
+    lats = [c["lat"] for c in pool]
+    lons = [c["lon"] for c in pool]
+    ranked = rank_nearest(curr_lat, curr_lon, lats, lons, k=10)
+    nearest = [pool[i] for _, i in ranked]
+
+    if nearest and nearest[0]["source"] == "google":
+        distances = await get_driving_distances(curr_lat, curr_lon, [(c["lat"], c["lon"]) for c in nearest])
+        url_for = _google_maps_url
+    else:
+        distances = [d for d, _ in ranked]
+        url_for = _osm_maps_url
+
+    results = [{
+        "name": c["name"],
+        "lat": c["lat"], "lon": c["lon"],
+        "address": c["address"],
+        "rating": c["rating"],
+        "maps_url": url_for(curr_lat, curr_lon, c["lat"], c["lon"]),
+        "distance_km": distances[i],
+        "available_specialist": clean_spec
+    } for i, c in enumerate(nearest)]
+    return sorted(results, key=lambda x: x["distance_km"])[:8]
+
+# =========================
+# PER-CALLER FIELDS
+# =========================
+# Hospital lists are cached per geohash cell and shared by everyone in it, so
+# the cached copy keeps only facility data; distance_km and maps_url are
+# rebuilt from each caller's own location.
+_CALLER_FIELDS = ("maps_url", "distance_km")
+_DIRECTIONS = {"google": _google_maps_url, "osm": _osm_maps_url}
+
+def shareable_hospitals(hospitals):
+    """hospitals without the fields computed from the caller's location."""
+    return [{
+        **{k: v for k, v in h.items() if k not in _CALLER_FIELDS},
+        "directions": "google" if h["maps_url"].startswith("https://www.google.com/") else "osm",
+    } for h in hospitals]
+
+def personalize_hospitals(facilities, lat: float, lon: float):
+    """Hospitals with distance_km and maps_url from (lat, lon), nearest first."""
+    if not facilities:
+        return []
+    curr_lat, curr_lon = resolve_origin(lat, lon)
+    distances = haversine_many(curr_lat, curr_lon, [f["lat"] for f in facilities], [f["lon"] for f in facilities])
+    results = []
+    for f, dist in zip(facilities, distances):
+        h = {k: v for k, v in f.items() if k != "directions"}
+        h["maps_url"] = _DIRECTIONS[f.get("directions", "osm")](curr_lat, curr_lon, f["lat"], f["lon"])
+        h["distance_km"] = float(dist)
+        results.append(h)
+    return sorted(results, key=lambda x: x["distance_km"])
@@ -0,0 +1,163 @@
+"""In-process latency histograms, Server-Timing and an opt-in slow-request profiler.
+
+Hot-path code wraps each stage in `with stage("name"):`. Every stage feeds a
+fixed-bucket histogram (one bisect and three additions per observation) and,
+when inside an HTTP request, adds its duration to that request's timings.
+ServerTimingMiddleware turns those into a `Server-Timing` header, and
+render_prometheus() exposes the histograms in Prometheus text format.
+
+Child tasks inherit the request's timings through the context variable, so
+work started with asyncio.create_task (prefetches, hospital searches) is
+attributed to the request that started it. Stages that run more than once
+per request (e.g. several Overpass calls) are summed in the header.
+
+Slow-request profiling is off unless PROFILE_SLOW_MS is set: a
+PROFILE_SAMPLE_RATE fraction of requests then runs under cProfile (one at a
+time), and the profile is kept in PROFILE_DIR only if the request took longer
+than PROFILE_SLOW_MS. cProfile sees the whole event loop thread, so other
+requests interleaved with the sampled one show up in its profile too.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import logger
+
+# Upper bounds (ms); the implicit last bucket is +Inf
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", 0))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.05))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(__file__), "profiles"))
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, ms: float):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.sum += ms
+        self.count += 1
+
+
+_histograms = {}  # stage name -> Histogram
+_request_timings = ContextVar("request_timings", default=None)
+
+
+def observe(name: str, ms: float):
+    hist = _histograms.get(name)
+    if hist is None:
+        hist = _histograms[name] = Histogram()
+    hist.observe(ms)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + ms
+
+
+@contextmanager
+def stage(name: str):
+    """Times the enclosed block as one observation of `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, (time.perf_counter() - start) * 1000)
+
+
+def render_prometheus(gauges: dict = None):
+    """All histograms (plus any point-in-time gauges) in Prometheus text format."""
+    lines = []
+    for name, value in (gauges or {}).items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    lines += [
+        "# HELP stage_latency_ms Latency of hot-path stages in milliseconds.",
+        "# TYPE stage_latency_ms histogram",
+    ]
+    for name, hist in sorted(_histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS_MS + ("+Inf",), hist.counts):
+            cumulative += count
+            lines.append(f'stage_latency_ms_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'stage_latency_ms_sum{{stage="{name}"}} {round(hist.sum, 3)}')
+        lines.append(f'stage_latency_ms_count{{stage="{name}"}} {hist.count}')
+    return "\n".join(lines) + "\n"
+
+
+def server_timing(timings: dict, total_ms: float):
+    parts = [f"{name};dur={ms:.1f}" for name, ms in timings.items()]
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
+
+
+# =========================
+# SLOW REQUEST PROFILER
+# =========================
+_profiling = False
+
+def _start_profile():
+    global _profiling
+    if PROFILE_SLOW_MS <= 0 or _profiling or random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    _profiling = True
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def _finish_profile(profiler, path: str, total_ms: float):
+    global _profiling
+    profiler.disable()
+    _profiling = False
+    if total_ms < PROFILE_SLOW_MS:
+        return
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    out = os.path.join(PROFILE_DIR, f"{int(time.time() * 1000)}_{path.strip('/').replace('/', '_') or 'root'}.prof")
+    profiler.dump_stats(out)
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(15)
+    logger.warning(f"🐢 Slow request {path} ({total_ms:.0f} ms), profile saved to {out}\n{summary.getvalue()}")
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware: per-request timings, Server-Timing header, request histogram."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = {}
+        token = _request_timings.set(timings)
+        profiler = _start_profile()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - start) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(timings, total_ms).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            total_ms = (time.perf_counter() - start) * 1000
+            _request_timings.reset(token)
+            observe("request", total_ms)
+            if profiler is not None:
+                _finish_profile(profiler, scope.get("path", ""), total_ms)
@@ -0,0 +1,248 @@
+"""Concurrency governor for AI model calls.
+
+Every generate/stream call goes through one ModelGateway:
+
+- at most LLM_MAX_CONCURRENCY calls run at once; up to LLM_MAX_QUEUE more
+  wait for a slot, and anything beyond that is rejected immediately
+- each call gets a deadline derived from the observed p95 latency (clamped
+  to [LLM_TIMEOUT_MIN_S, LLM_TIMEOUT_MAX_S]); time spent queued counts
+- after LLM_BREAKER_FAILURES consecutive failures the breaker opens and calls
+  fail fast for LLM_BREAKER_COOLDOWN_S, then a single probe call decides
+  whether it closes again
+
+Every refusal raises ModelUnavailable, which callers already treat like any
+other AI failure (mock fallback), so an outage costs microseconds per request
+instead of a full upstream timeout.
+"""
+
+import asyncio
+import os
+import time
+from config import logger
+from utils import RollingPercentile
+from metrics import stage, observe
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", 32))
+LLM_TIMEOUT_MIN_S = float(os.getenv("LLM_TIMEOUT_MIN_S", 5))
+LLM_TIMEOUT_MAX_S = float(os.getenv("LLM_TIMEOUT_MAX_S", 30))
+# Deadline = p95 * factor, once enough calls have been observed
+LLM_TIMEOUT_P95_FACTOR = float(os.getenv("LLM_TIMEOUT_P95_FACTOR", 2.0))
+LLM_TIMEOUT_MIN_SAMPLES = 20
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", 30))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class ModelUnavailable(Exception):
+    """The gateway refused the call (no model, breaker open, or queue full)."""
+
+
+class ModelGateway:
+    def __init__(self, model, max_concurrency: int = LLM_MAX_CONCURRENCY, max_queue: int = LLM_MAX_QUEUE):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._latency = RollingPercentile()
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued_seen = 0
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.short_circuited = 0
+        self.state = CLOSED
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._probing = False
+
+    # ---- deadline ---------------------------------------------------------
+
+    def deadline_s(self):
+        if len(self._latency) < LLM_TIMEOUT_MIN_SAMPLES:
+            return LLM_TIMEOUT_MAX_S
+        p95 = self._latency.percentile(95)
+        return min(LLM_TIMEOUT_MAX_S, max(LLM_TIMEOUT_MIN_S, p95 * LLM_TIMEOUT_P95_FACTOR))
+
+    # ---- circuit breaker --------------------------------------------------
+
+    def _admit(self):
+        """Raises ModelUnavailable unless the breaker lets this call through."""
+        if self.model is None:
+            raise ModelUnavailable("AI Model not initialized")
+        if self.state == OPEN:
+            if time.monotonic() < self._open_until:
+                self.short_circuited += 1
+                raise ModelUnavailable("AI circuit open")
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._probing:
+                self.short_circuited += 1
+                raise ModelUnavailable("AI circuit half-open, probe in progress")
+            self._probing = True
+
+    def _record_success(self, elapsed: float):
+        self._latency.add(elapsed)
+        self._consecutive_failures = 0
+        self._probing = False
+        if self.state != CLOSED:
+            logger.info("✅ AI circuit closed")
+            self.state = CLOSED
+
+    def _record_failure(self, error):
+        self.failures += 1
+        self._consecutive_failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self._consecutive_failures >= LLM_BREAKER_FAILURES:
+            if self.state != OPEN:
+                logger.warning(f"⚡ AI circuit open for {LLM_BREAKER_COOLDOWN_S}s after: {error}")
+            self.state = OPEN
+            self._open_until = time.monotonic() + LLM_BREAKER_COOLDOWN_S
+
+    def _record_cancel(self):
+        # The caller went away; this says nothing about the upstream
+        self._probing = False
+
+    # ---- slots ------------------------------------------------------------
+
+    async def _acquire(self, deadline: float):
+        if not self._slots.locked():
+            # Free slot: acquire() returns without suspending
+            await self._slots.acquire()
+            self.in_flight += 1
+            return
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise ModelUnavailable("AI queue full")
+        self.queued += 1
+        self.max_queued_seen = max(self.max_queued_seen, self.queued)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            # Overload, not an upstream failure: does not count towards the breaker
+            self.rejected += 1
+            raise ModelUnavailable("AI queue wait exceeded the deadline")
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    # ---- calls ------------------------------------------------------------
+
+    async def generate(self, prompt: str):
+        """Model output text for prompt, within the current deadline."""
+        self._admit()
+        self.calls += 1
+        start = time.monotonic()
+        deadline = start + self.deadline_s()
+        try:
+            with stage("ai_queue"):
+                await self._acquire(deadline)
+            # Only the model call feeds the latency window, not the queue wait
+            call_start = time.monotonic()
+            try:
+                with stage("ai"):
+                    res = await asyncio.wait_for(
+                        self.model.generate_content_async(prompt), max(0.0, deadline - call_start)
+                    )
+                elapsed = time.monotonic() - call_start
+            finally:
+                self._release()
+        except asyncio.CancelledError:
+            self._record_cancel()
+            raise
+        except ModelUnavailable:
+            self._record_cancel()
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                e = TimeoutError(f"AI call exceeded {deadline - start:.1f}s deadline")
+            self._record_failure(e)
+            raise e
+        self._record_success(elapsed)
+        return getattr(res, 'text', None) or getattr(res, 'response', None) or str(res)
+
+    async def stream(self, prompt: str):
+        """Yields output chunks; the deadline covers the whole stream."""
+        self._admit()
+        self.calls += 1
+        start = time.monotonic()
+        deadline = start + self.deadline_s()
+        chunks = self._stream_raw(prompt)
+        try:
+            with stage("ai_queue"):
+                await self._acquire(deadline)
+            # Only time spent waiting on the model counts, not the consumer's
+            waited = 0.0
+            try:
+                while True:
+                    chunk_start = time.perf_counter()
+                    try:
+                        chunk = await asyncio.wait_for(
+                            chunks.__anext__(), max(0.0, deadline - time.monotonic())
+                        )
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        waited += time.perf_counter() - chunk_start
+                    yield chunk
+            finally:
+                observe("ai", waited * 1000)
+                self._release()
+                await chunks.aclose()
+        except (asyncio.CancelledError, GeneratorExit, ModelUnavailable):
+            self._record_cancel()
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                e = TimeoutError(f"AI stream exceeded {deadline - start:.1f}s deadline")
+            self._record_failure(e)
+            raise e
+        self._record_success(waited)
+
+    async def _stream_raw(self, prompt: str):
+        """Model output chunks, using the SDK's streaming API when available."""
+        if hasattr(self.model, "stream_content_async"):
+            async for chunk in self.model.stream_content_async(prompt):
+                yield chunk
+            return
+        try:
+            responses = await self.model.generate_content_async(prompt, stream=True)
+        except TypeError:
+            # Model without stream support: deliver the whole answer as one chunk
+            res = await self.model.generate_content_async(prompt)
+            yield getattr(res, 'text', None) or str(res)
+            return
+        async for res in responses:
+            yield getattr(res, 'text', '') or ''
+
+    def close(self):
+        close = getattr(self.model, "close", None)
+        if close:
+            close()
+
+    def stats(self):
+        p95 = self._latency.percentile(95)
+        return {
+            "state": self.state,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queued_seen": self.max_queued_seen,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "short_circuited": self.short_circuited,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "deadline_s": round(self.deadline_s(), 2),
+        }
@@ -33,4 +33,8 @@ class FinalResponse(BaseModel):
 class HospitalRequest(BaseModel):
     latitude: float
     longitude: float
-    symptoms: str
\ No newline at end of file
+    symptoms: str
+
+class BatchTriageRequest(BaseModel):
+    requests: List[HospitalRequest]
+    mental_health: bool = False
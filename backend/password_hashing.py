@@ -0,0 +1,78 @@
+"""PBKDF2 password hashing off the event loop.
+
+Hashing and verification run in a bounded worker pool so a login burst
+queues work there instead of freezing every in-flight request. When more than
+AUTH_HASH_MAX_PENDING operations are already waiting, new ones are rejected
+with HashingBusy so the caller can shed load (HTTP 503) instead of piling up.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from passlib.context import CryptContext
+
+# "thread" works well because hashlib's PBKDF2 releases the GIL;
+# "process" isolates hashing completely at the cost of IPC per call.
+HASH_EXECUTOR = os.getenv("AUTH_HASH_EXECUTOR", "thread")
+HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+HASH_MAX_PENDING = int(os.getenv("AUTH_HASH_MAX_PENDING", HASH_WORKERS * 16))
+# passlib's default for pbkdf2_sha256; existing hashes keep their own rounds
+PBKDF2_ROUNDS = int(os.getenv("AUTH_PBKDF2_ROUNDS", 29000))
+
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=PBKDF2_ROUNDS,
+)
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return pwd_context.verify(password, hashed)
+
+
+_executor = None
+_pending = 0
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        if HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="pwd-hash")
+    return _executor
+
+
+async def _submit(fn, *args):
+    global _pending
+    if _pending >= HASH_MAX_PENDING:
+        raise HashingBusy(f"{_pending} password operations already queued")
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    return await _submit(_hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _submit(_verify, password, hashed)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
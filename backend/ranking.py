@@ -0,0 +1,79 @@
+"""Vectorized distance and nearest-k ranking for hospital candidates.
+
+Uses NumPy when it is installed and falls back to the scalar
+`utils.calculate_distance` otherwise, so results are identical either way
+(distances are rounded to 2 decimals like the scalar helper).
+"""
+
+import heapq
+import math
+from utils import calculate_distance
+
+try:
+    import numpy as np
+except ImportError:  # optional: pure-Python fallback below
+    np = None
+
+EARTH_RADIUS_KM = 6371.0
+_KM_PER_DEG = 111.195
+
+
+def haversine_many(lat: float, lon: float, lats, lons):
+    """Great-circle distances (km) from one point to arrays of points."""
+    if np is None:
+        return [calculate_distance(lat, lon, p_lat, p_lon) for p_lat, p_lon in zip(lats, lons)]
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    phi1 = math.radians(lat)
+    dlat = lats - phi1
+    dlon = lons - math.radians(lon)
+    a = np.sin(dlat / 2) ** 2 + math.cos(phi1) * np.cos(lats) * np.sin(dlon / 2) ** 2
+    return np.round(EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a)), 2)
+
+
+def bbox_mask(lat: float, lon: float, lats, lons, radius_km: float):
+    """Cheap lat/lon box test that keeps every point within radius_km."""
+    dlat = radius_km / _KM_PER_DEG
+    dlon = radius_km / (_KM_PER_DEG * max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6))
+    if np is None:
+        return [abs(p_lat - lat) <= dlat and abs((p_lon - lon + 180) % 360 - 180) <= dlon
+                for p_lat, p_lon in zip(lats, lons)]
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    return (np.abs(lats - lat) <= dlat) & (np.abs((lons - lon + 180) % 360 - 180) <= dlon)
+
+
+def rank_nearest(lat: float, lon: float, lats, lons, k: int = 8, max_km: float = None):
+    """Returns up to k (distance_km, index) pairs into lats/lons, nearest first.
+
+    With max_km, candidates outside the bounding box are dropped before any
+    trigonometry and results beyond max_km are excluded.
+    """
+    if len(lats) == 0 or k <= 0:
+        return []
+
+    if np is None:
+        idx = range(len(lats))
+        if max_km is not None:
+            mask = bbox_mask(lat, lon, lats, lons, max_km)
+            idx = [i for i in idx if mask[i]]
+        scored = ((calculate_distance(lat, lon, lats[i], lons[i]), i) for i in idx)
+        if max_km is not None:
+            scored = (s for s in scored if s[0] <= max_km)
+        return heapq.nsmallest(k, scored)
+
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    idx = np.arange(len(lats))
+    if max_km is not None:
+        idx = idx[bbox_mask(lat, lon, lats, lons, max_km)]
+    dist = haversine_many(lat, lon, lats[idx], lons[idx])
+    if max_km is not None:
+        keep = dist <= max_km
+        idx, dist = idx[keep], dist[keep]
+    if len(idx) > k:
+        # O(n) selection of the k smallest, then sort only those k
+        top = np.argpartition(dist, k - 1)[:k]
+        idx, dist = idx[top], dist[top]
+    order = np.lexsort((idx, dist))
+    return [(float(dist[i]), int(idx[i])) for i in order]
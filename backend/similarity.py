@@ -0,0 +1,117 @@
+"""MinHash/LSH index for serving cached triage to near-identical symptom text.
+
+Symptom text is normalized (see utils.normalize_symptoms) and shingled into
+words plus character 3-grams, so reordering, filler words and small typos
+still produce overlapping shingle sets. Candidates found through LSH banding
+are accepted only when their estimated Jaccard similarity reaches the
+threshold, and only within the same namespace (the triage mode), so a match
+never crosses triage modes. Triage does not depend on location, so matches
+are shared across neighbourhoods. Texts that negate different terms ("chest
+pain" vs "no chest pain") never match, however similar they are otherwise.
+"""
+
+import os
+import random
+import zlib
+from collections import OrderedDict
+from utils import NEGATED_PREFIX
+
+SIMILARITY_ENABLED = os.getenv("TRIAGE_SIMILARITY", "0") == "1"
+SIMILARITY_THRESHOLD = float(os.getenv("TRIAGE_SIMILARITY_THRESHOLD", 0.85))
+SIMILARITY_MAX_ITEMS = int(os.getenv("TRIAGE_SIMILARITY_MAX_ITEMS", 20000))
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1337)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def shingles(normalized: str):
+    words = normalized.split()
+    grams = set(words)
+    for word in words:
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def minhash(normalized: str):
+    hashes = [zlib.crc32(g.encode()) for g in shingles(normalized)]
+    if not hashes:
+        return None
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS)
+
+
+def negated_terms(normalized: str):
+    return frozenset(t for t in normalized.split() if t.startswith(NEGATED_PREFIX))
+
+
+def estimated_jaccard(sig_a, sig_b):
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+class MinHashIndex:
+    """Bounded LSH index mapping (namespace, symptom text) to cache keys."""
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, max_items: int = SIMILARITY_MAX_ITEMS):
+        self.threshold = threshold
+        self.max_items = max_items
+        self._entries = OrderedDict()  # cache_key -> (namespace, signature, negated terms)
+        self._buckets = {}  # (namespace, band, band_hash) -> set of cache keys
+        self.matches = 0
+        self.lookups = 0
+
+    def _bands(self, namespace, signature):
+        for band in range(BANDS):
+            yield (namespace, band, hash(signature[band * ROWS:(band + 1) * ROWS]))
+
+    def add(self, namespace: str, normalized: str, cache_key: str):
+        signature = minhash(normalized)
+        if signature is None:
+            return
+        self.remove(cache_key)
+        self._entries[cache_key] = (namespace, signature, negated_terms(normalized))
+        for bucket in self._bands(namespace, signature):
+            self._buckets.setdefault(bucket, set()).add(cache_key)
+        while len(self._entries) > self.max_items:
+            self.remove(next(iter(self._entries)))
+
+    def remove(self, cache_key: str):
+        entry = self._entries.pop(cache_key, None)
+        if entry is None:
+            return
+        for bucket in self._bands(entry[0], entry[1]):
+            keys = self._buckets.get(bucket)
+            if keys is not None:
+                keys.discard(cache_key)
+                if not keys:
+                    del self._buckets[bucket]
+
+    def lookup(self, namespace: str, normalized: str):
+        """Returns the most similar cache key at or above the threshold, or None."""
+        self.lookups += 1
+        signature = minhash(normalized)
+        if signature is None:
+            return None
+        candidates = set()
+        for bucket in self._bands(namespace, signature):
+            candidates.update(self._buckets.get(bucket, ()))
+
+        negated = negated_terms(normalized)
+        best_key, best_score = None, self.threshold
+        for key in candidates:
+            _, candidate, candidate_negated = self._entries[key]
+            if candidate_negated != negated:
+                continue
+            score = estimated_jaccard(signature, candidate)
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is not None:
+            self.matches += 1
+            self._entries.move_to_end(best_key)
+        return best_key
+
+    def stats(self):
+        return {"entries": len(self._entries), "lookups": self.lookups, "matches": self.matches}
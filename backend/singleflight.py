@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+import uuid
+from config import logger
+
+# How long a cross-worker leader may hold the lock before others take over
+LOCK_TTL_MS = int(os.getenv("SINGLEFLIGHT_LOCK_TTL_MS", 30000))
+# How often followers in other workers poll the cache for the leader's result
+POLL_INTERVAL_S = float(os.getenv("SINGLEFLIGHT_POLL_INTERVAL_S", 0.1))
+
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution.
+
+    Within a worker, the first caller for a key (the leader) runs the work and
+    every concurrent caller awaits the same future. When the cache has a live
+    Redis connection, leaders in different workers additionally race for a
+    `SET NX PX` lock; the losers poll the cache until the winner publishes
+    the result there.
+    """
+
+    def __init__(self, cache=None, decode=json.loads):
+        self.cache = cache
+        # Turns the raw cached string a remote leader published into a result
+        self.decode = decode
+        self._inflight = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: str, fn):
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.followers += 1
+            try:
+                # shield() so a cancelled follower does not cancel the leader's work
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise
+                # The leader itself was cancelled: take over the work
+                return await self.do(key, fn)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        self.leaders += 1
+        try:
+            result = await self._run_leader(key, fn)
+            fut.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            # Mark retrieved so an unobserved failure does not log a warning
+            fut.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _run_leader(self, key: str, fn):
+        redis = self.cache.redis if self.cache else None
+        if redis is None:
+            return await fn()
+
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await redis.set(lock_key, token, nx=True, px=LOCK_TTL_MS)
+        except Exception as e:
+            logger.error(f"Single-flight lock error: {e}")
+            return await fn()
+
+        if acquired:
+            try:
+                return await fn()
+            finally:
+                try:
+                    await redis.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    logger.error(f"Single-flight unlock error: {e}")
+
+        # Another worker is computing this key: wait for it to publish the result
+        waited = 0.0
+        while waited < LOCK_TTL_MS / 1000:
+            await asyncio.sleep(POLL_INTERVAL_S)
+            waited += POLL_INTERVAL_S
+            try:
+                cached = await self.cache.get(key)
+                if cached:
+                    return self.decode(cached)
+                if not await redis.exists(lock_key):
+                    break
+            except Exception as e:
+                logger.error(f"Single-flight poll error: {e}")
+                break
+
+        # Leader died or gave up without publishing; compute it ourselves
+        return await fn()
+
+    def stats(self):
+        return {"leaders": self.leaders, "followers": self.followers}
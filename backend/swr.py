@@ -0,0 +1,116 @@
+"""Stale-while-revalidate layer over the tiered cache.
+
+Entries are stored as {"v": value, "f": fresh_until}. Before fresh_until
+(the soft TTL) a hit is served as-is. Between the soft TTL and the Redis
+expiry (the hard TTL) the stale value is still served immediately while one
+background task reloads it. Soft expiry is jittered so entries written
+together do not all go stale together.
+"""
+
+import asyncio
+import json
+import random
+import time
+from config import logger
+from singleflight import SingleFlight
+
+# Soft expiry lands in [soft_ttl * (1 - SWR_JITTER), soft_ttl]
+SWR_JITTER = 0.2
+
+
+def min_fresh_for(soft_ttl: int):
+    """Lower bound on how long a value written now stays fresh."""
+    return soft_ttl * (1 - SWR_JITTER)
+
+
+def _decode(raw: str):
+    return json.loads(raw)["v"]
+
+
+class SWRCache:
+    def __init__(self, cache):
+        self.cache = cache
+        self.flight = SingleFlight(cache, decode=_decode)
+        self._refreshing = {}  # key -> background task
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    async def peek_for(self, key: str):
+        """Returns (value, seconds it stays fresh), or (None, 0) on a miss.
+
+        The seconds are <= 0 for a stale entry.
+        """
+        try:
+            raw = await self.cache.get(key)
+        except Exception as e:
+            logger.error(f"Cache Error: {e}")
+            return None, 0
+        if not raw:
+            return None, 0
+        entry = json.loads(raw)
+        return entry["v"], entry["f"] - time.time()
+
+    async def set(self, key: str, value, soft_ttl: int, hard_ttl: int):
+        fresh_until = time.time() + soft_ttl * random.uniform(1 - SWR_JITTER, 1)
+        try:
+            await self.cache.setex(key, hard_ttl, json.dumps({"v": value, "f": fresh_until}))
+        except Exception as e:
+            logger.error(f"Cache Error: {e}")
+
+    async def _load(self, key: str, loader, soft_ttl: int, hard_ttl: int):
+        value = await loader()
+        # Empty results usually mean an upstream failure; do not pin them
+        if value:
+            await self.set(key, value, soft_ttl, hard_ttl)
+        return value
+
+    def _refresh_in_background(self, key: str, loader, soft_ttl: int, hard_ttl: int):
+        if key in self._refreshing:
+            return
+        self.refreshes += 1
+
+        async def _refresh():
+            try:
+                await self.flight.do(key, lambda: self._load(key, loader, soft_ttl, hard_ttl))
+            except Exception as e:
+                logger.warning(f"Background refresh of {key} failed: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(_refresh())
+
+    def revalidate(self, key: str, fresh: bool, loader, soft_ttl: int, hard_ttl: int):
+        """Records a hit and, if it was stale, refreshes it in the background."""
+        if fresh:
+            self.fresh_hits += 1
+        else:
+            self.stale_hits += 1
+            self._refresh_in_background(key, loader, soft_ttl, hard_ttl)
+
+    async def load(self, key: str, loader, soft_ttl: int, hard_ttl: int):
+        """Loads and stores a missing key; concurrent callers share one load."""
+        self.misses += 1
+        return await self.flight.do(key, lambda: self._load(key, loader, soft_ttl, hard_ttl))
+
+    async def get_for(self, key: str, loader, soft_ttl: int, hard_ttl: int):
+        """Cached value for key, serving stale entries while they refresh, and
+        how many seconds it stays fresh (<= 0 if stale).
+
+        For a value loaded just now this is the shortest jittered soft TTL.
+        """
+        value, fresh_for = await self.peek_for(key)
+        if value is not None:
+            self.revalidate(key, fresh_for > 0, loader, soft_ttl, hard_ttl)
+            return value, fresh_for
+        return await self.load(key, loader, soft_ttl, hard_ttl), min_fresh_for(soft_ttl)
+
+    def stats(self):
+        return {
+            "fresh_hits": self.fresh_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "background_refreshes": self.refreshes,
+            "singleflight": self.flight.stats(),
+        }
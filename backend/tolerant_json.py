@@ -0,0 +1,197 @@
+"""Single-pass, tolerant parser for JSON produced by language models.
+
+Handles the ways model output usually deviates from strict JSON, in one left
+to right scan with no retries:
+
+- markdown fences and prose before/after the object (everything outside the
+  first top-level {...} is ignored)
+- single-quoted strings and Python literals (True/False/None)
+- unquoted object keys and trailing commas
+- truncated output: open strings, arrays and objects are closed at the end
+
+The parser is a push parser, so it also works on streamed chunks: `feed()`
+consumes only the new text, and `pop_completed()` returns top-level fields
+as soon as their values are complete.
+"""
+
+_WHITESPACE = " \t\r\n"
+_DELIMITERS = ",:]}" + _WHITESPACE
+_LITERALS = {
+    "true": True, "false": False, "null": None,
+    "True": True, "False": False, "None": None,
+}
+_ESCAPES = {'"': '"', "'": "'", "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+# What an object frame expects next
+_KEY, _COLON, _VALUE, _COMMA = range(4)
+
+
+def _bare_value(word: str):
+    if word in _LITERALS:
+        return True, _LITERALS[word]
+    try:
+        return True, int(word)
+    except ValueError:
+        pass
+    try:
+        return True, float(word)
+    except ValueError:
+        return False, None
+
+
+class TolerantJSONParser:
+    def __init__(self):
+        self.root = None
+        self.done = False
+        self._stack = []  # frames: [container, state, pending_key]
+        self._quote = None  # active string quote char, or None
+        self._buf = []  # characters of the current string / bare word
+        self._escape = False
+        self._unicode = None  # hex digits collected after \u
+        self._bare = False  # inside a bare word (number, literal, unquoted key)
+        self._completed = []
+
+    # ---- value plumbing -------------------------------------------------
+
+    def _emit(self, value, is_key_candidate=False):
+        frame = self._stack[-1]
+        container, state = frame[0], frame[1]
+        if isinstance(container, list):
+            container.append(value)
+        elif state == _KEY:
+            if is_key_candidate or isinstance(value, str):
+                frame[2] = str(value)
+                frame[1] = _COLON
+            return
+        elif state in (_VALUE, _COLON):
+            # Missing colon ({"a" "b"}) is tolerated
+            container[frame[2]] = value
+            frame[1] = _COMMA
+            if len(self._stack) == 1 and not isinstance(value, (dict, list)):
+                self._completed.append((frame[2], value))
+
+    def _open(self, container):
+        if self._stack:
+            self._emit(container)
+        else:
+            self.root = container
+        self._stack.append([container, _KEY if isinstance(container, dict) else _VALUE, None])
+
+    def _close(self):
+        container = self._stack.pop()[0]
+        if not self._stack:
+            self.done = True
+        elif len(self._stack) == 1 and isinstance(self._stack[0][0], dict):
+            self._completed.append((self._stack[0][2], container))
+
+    def _finish_bare(self):
+        word = "".join(self._buf)
+        self._buf = []
+        self._bare = False
+        frame = self._stack[-1]
+        if isinstance(frame[0], dict) and frame[1] == _KEY:
+            self._emit(word, is_key_candidate=True)
+            return
+        ok, value = _bare_value(word)
+        if ok:
+            self._emit(value)
+
+    # ---- scanning ---------------------------------------------------------
+
+    def feed(self, text: str):
+        for ch in text:
+            if self.done:
+                return self
+            if not self._stack:
+                # Skip fences and prose until the first object opens
+                if ch == "{":
+                    self._open({})
+                continue
+
+            if self._quote is not None:
+                self._string_char(ch)
+                continue
+
+            if self._bare:
+                if ch not in _DELIMITERS:
+                    self._buf.append(ch)
+                    continue
+                self._finish_bare()
+
+            if ch in _WHITESPACE:
+                continue
+            if ch == '"' or ch == "'":
+                self._quote = ch
+            elif ch == "{":
+                self._open({})
+            elif ch == "[":
+                self._open([])
+            elif ch == "}" or ch == "]":
+                self._close()
+            elif ch == ":":
+                frame = self._stack[-1]
+                if frame[1] == _COLON:
+                    frame[1] = _VALUE
+            elif ch == ",":
+                frame = self._stack[-1]
+                if isinstance(frame[0], dict):
+                    frame[1] = _KEY
+            else:
+                self._bare = True
+                self._buf.append(ch)
+        return self
+
+    def _string_char(self, ch: str):
+        if self._unicode is not None:
+            self._unicode += ch
+            if len(self._unicode) == 4:
+                try:
+                    self._buf.append(chr(int(self._unicode, 16)))
+                except ValueError:
+                    self._buf.append("\\u" + self._unicode)
+                self._unicode = None
+        elif self._escape:
+            self._escape = False
+            if ch == "u":
+                self._unicode = ""
+            else:
+                self._buf.append(_ESCAPES.get(ch, ch))
+        elif ch == "\\":
+            self._escape = True
+        elif ch == self._quote:
+            value = "".join(self._buf)
+            self._buf = []
+            self._quote = None
+            self._emit(value)
+        else:
+            self._buf.append(ch)
+
+    # ---- results ----------------------------------------------------------
+
+    def pop_completed(self):
+        """Top-level (key, value) pairs completed since the last call."""
+        completed, self._completed = self._completed, []
+        return completed
+
+    def finish(self):
+        """Closes anything left open (truncated output) and returns the root."""
+        if self._stack and not self.done:
+            if self._quote is not None:
+                # Keep a truncated string value, but not a truncated key
+                frame = self._stack[-1]
+                value = "".join(self._buf)
+                self._buf, self._quote, self._escape, self._unicode = [], None, False, None
+                if not (isinstance(frame[0], dict) and frame[1] == _KEY):
+                    self._emit(value)
+            elif self._bare:
+                self._finish_bare()
+            while self._stack:
+                self._close()
+        return self.root
+
+
+def parse_tolerant(text: str):
+    """Parses the first JSON-like object in text, or returns None."""
+    if not text or not isinstance(text, str):
+        return None
+    return TolerantJSONParser().feed(text).finish()
@@ -0,0 +1,248 @@
+"""Upstream HTTP layer: per-host connection pools, per-endpoint deadlines and
+hedged requests across mirrors.
+
+Every upstream host gets its own httpx client, sized by
+UPSTREAM_MAX_CONNECTIONS / UPSTREAM_MAX_KEEPALIVE, with connection-level
+retries and HTTP/2 when the optional `h2` package is installed. Clients are
+created on first use in each worker and closed from the app lifespan.
+
+An Upstream is one logical endpoint (Places, Distance Matrix, Overpass) with
+a hard deadline for the whole call and one or more interchangeable URLs
+(mirrors). A call goes to the preferred mirror; if it has not answered
+after the mirror's recent p95 latency, one hedged duplicate goes to the next
+mirror and whichever answers first wins (the other is cancelled). A mirror
+that errors is failed over immediately. Each mirror keeps a rolling latency
+window of completed calls and an error-rate average: the p95 sets the hedge
+delay and mirrors whose error rate passes UPSTREAM_UNHEALTHY_ERROR_RATE move
+to the back, while healthy ones are tried fastest (median) first. Attempts
+cut short by a lost hedge race or the deadline are only counted
+(`cancelled`); their partial elapsed time is not a latency sample. Instead a
+per-mirror hedge loss rate moves a mirror that keeps losing races behind
+the one beating it, even before it has enough latency samples.
+"""
+
+import asyncio
+import os
+import time
+from urllib.parse import urlsplit
+import httpx
+from config import logger
+from metrics import stage
+from utils import RollingPercentile
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", 50))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", 20))
+UPSTREAM_KEEPALIVE_EXPIRY_S = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY_S", 30))
+UPSTREAM_CONNECT_TIMEOUT_S = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT_S", 2))
+# Retries of failed connection attempts (never of sent requests)
+UPSTREAM_CONNECT_RETRIES = int(os.getenv("UPSTREAM_CONNECT_RETRIES", 1))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "1") == "1" and HTTP2_AVAILABLE
+
+# Hedge delay bounds; until a mirror has latency samples the maximum is used
+UPSTREAM_HEDGE_MIN_MS = float(os.getenv("UPSTREAM_HEDGE_MIN_MS", 200))
+UPSTREAM_HEDGE_MAX_MS = float(os.getenv("UPSTREAM_HEDGE_MAX_MS", 3000))
+UPSTREAM_UNHEALTHY_ERROR_RATE = float(os.getenv("UPSTREAM_UNHEALTHY_ERROR_RATE", 0.5))
+# Latency samples a mirror needs before its median is used to order mirrors
+UPSTREAM_MIN_SAMPLES = int(os.getenv("UPSTREAM_MIN_SAMPLES", 20))
+# Weight of the newest outcome in the per-mirror error-rate average
+_ERROR_EWMA_ALPHA = 0.1
+
+
+class UpstreamError(Exception):
+    """The upstream answered with an error status, or no mirror answered in time."""
+
+
+# =========================
+# PER-HOST CLIENTS
+# =========================
+_clients = {}  # "scheme://host:port" -> AsyncClient
+
+def client_for(url: str):
+    """The pooled client for url's host, created on first use in this worker."""
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    client = _clients.get(origin)
+    if client is None:
+        limits = httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY_S,
+        )
+        transport = httpx.AsyncHTTPTransport(limits=limits, http2=UPSTREAM_HTTP2, retries=UPSTREAM_CONNECT_RETRIES)
+        client = _clients[origin] = httpx.AsyncClient(
+            transport=transport, timeout=httpx.Timeout(20.0, connect=UPSTREAM_CONNECT_TIMEOUT_S)
+        )
+    return client
+
+async def close_clients():
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+# =========================
+# UPSTREAM ENDPOINTS
+# =========================
+class Mirror:
+    __slots__ = ("url", "latency", "error_rate", "loss_rate", "calls", "errors", "wins", "cancelled")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency = RollingPercentile()
+        self.error_rate = 0.0
+        self.loss_rate = 0.0  # share of recent hedge races lost
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0  # answered first while a hedge was in flight
+        self.cancelled = 0  # lost a hedge race or hit the deadline
+
+    def record(self, ok: bool, seconds: float = None):
+        if ok:
+            self.latency.add(seconds)
+        else:
+            self.errors += 1
+        self.error_rate += _ERROR_EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+
+    def record_race(self, won: bool):
+        if won:
+            self.wins += 1
+        self.loss_rate += _ERROR_EWMA_ALPHA * ((0.0 if won else 1.0) - self.loss_rate)
+
+    @property
+    def healthy(self):
+        return self.error_rate < UPSTREAM_UNHEALTHY_ERROR_RATE
+
+    @property
+    def losing(self):
+        return self.loss_rate >= 0.5
+
+    def hedge_delay_s(self, deadline_s: float):
+        p95 = self.latency.percentile(95, default=UPSTREAM_HEDGE_MAX_MS / 1000)
+        return min(max(p95, UPSTREAM_HEDGE_MIN_MS / 1000), UPSTREAM_HEDGE_MAX_MS / 1000, deadline_s / 2)
+
+    def stats(self):
+        p95 = self.latency.percentile(95)
+        return {
+            "url": self.url,
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate, 3),
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "wins": self.wins,
+            "loss_rate": round(self.loss_rate, 3),
+            "cancelled": self.cancelled,
+        }
+
+
+class Upstream:
+    def __init__(self, name: str, urls, deadline_s: float, hedge: bool = True):
+        self.name = name
+        self.mirrors = [Mirror(url) for url in urls if url]
+        self.deadline_s = deadline_s
+        self.hedge = hedge and len(self.mirrors) > 1
+        self.calls = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.failovers = 0
+
+    def _ordered(self):
+        # Healthy mirrors first, then those not losing most hedge races, then
+        # fastest median; mirrors without enough samples sort as fastest so
+        # they get measured. Ties keep configured order.
+        def key(m):
+            median = m.latency.percentile(50) if len(m.latency) >= UPSTREAM_MIN_SAMPLES else 0.0
+            return (not m.healthy, m.losing, median)
+        return sorted(self.mirrors, key=key)
+
+    async def _attempt(self, mirror: Mirror, method: str, kwargs: dict):
+        mirror.calls += 1
+        start = time.monotonic()
+        try:
+            resp = await client_for(mirror.url).request(method, mirror.url, **kwargs)
+            if resp.status_code >= 500 or resp.status_code == 429:
+                raise UpstreamError(f"{self.name} mirror {mirror.url} returned {resp.status_code}")
+        except asyncio.CancelledError:
+            mirror.cancelled += 1
+            raise
+        except Exception:
+            mirror.record(False)
+            raise
+        mirror.record(True, time.monotonic() - start)
+        return resp
+
+    async def request(self, method: str, **kwargs):
+        """First successful response from any mirror within the deadline."""
+        self.calls += 1
+        kwargs.setdefault("timeout", httpx.Timeout(self.deadline_s, connect=UPSTREAM_CONNECT_TIMEOUT_S))
+        with stage(self.name):
+            try:
+                return await asyncio.wait_for(self._race(method, kwargs), self.deadline_s)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise UpstreamError(f"{self.name} exceeded {self.deadline_s:.1f}s deadline")
+
+    async def _race(self, method: str, kwargs: dict):
+        # 1. Primary mirror first; hedge (once) after its p95, fail over on error
+        queue = self._ordered()
+        running = {}  # task -> mirror
+        hedged = False
+        last_error = None
+
+        def launch():
+            mirror = queue.pop(0)
+            running[asyncio.create_task(self._attempt(mirror, method, kwargs))] = mirror
+
+        launch()
+        try:
+            while running:
+                wait_s = None
+                if self.hedge and not hedged and queue:
+                    wait_s = next(iter(running.values())).hedge_delay_s(self.deadline_s)
+                done, _ = await asyncio.wait(set(running), timeout=wait_s, return_when=asyncio.FIRST_COMPLETED)
+
+                # 2. Nothing back within the hedge delay: duplicate to the next mirror
+                if not done:
+                    hedged = True
+                    self.hedges += 1
+                    launch()
+                    continue
+
+                # 3. First success wins; errors fail over to the next mirror
+                for task in done:
+                    mirror = running.pop(task)
+                    try:
+                        resp = task.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if hedged:
+                        mirror.record_race(True)
+                        for loser in running.values():
+                            loser.record_race(False)
+                    return resp
+                if not running and queue:
+                    self.failovers += 1
+                    logger.warning(f"⚠️ {self.name} failing over to {queue[0].url}: {last_error}")
+                    launch()
+            raise last_error
+        finally:
+            # 4. Cancel the losers
+            for task in running:
+                task.cancel()
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "failovers": self.failovers,
+            "deadline_s": self.deadline_s,
+            "mirrors": [m.stats() for m in self.mirrors],
+        }
@@ -0,0 +1,107 @@
+"""SQLite user repository with a small connection pool.
+
+Each pool connection is used by one thread at a time, runs in WAL mode so
+readers never block on the writer, and keeps its own prepared-statement cache.
+Queries run on a dedicated executor sized to the pool, so they never block the
+event loop. Successful username lookups are kept in a short-lived local cache.
+"""
+
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cache import LocalCache
+
+DB_PATH = os.getenv("USERS_DB_PATH", "users.db")
+DB_POOL_SIZE = int(os.getenv("USERS_DB_POOL_SIZE", 4))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 300))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL
+)
+"""
+_SELECT_BY_USERNAME = "SELECT username, email, password FROM users WHERE username = ?"
+_INSERT_USER = "INSERT INTO users (username, email, password) VALUES (?, ?, ?)"
+
+
+class UserRepository:
+    def __init__(self, path: str = DB_PATH, pool_size: int = DB_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool = queue.Queue()
+        self._executor = None
+        self._open_lock = threading.Lock()
+        self._cache = LocalCache(max_items=10000)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=64)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def open(self):
+        """Creates the schema and fills the pool (blocking; later calls are no-ops)."""
+        with self._open_lock:
+            if self._executor is not None:
+                return
+            conn = self._connect()
+            conn.execute(_SCHEMA)
+            conn.commit()
+            self._pool.put(conn)
+            for _ in range(self.pool_size - 1):
+                self._pool.put(self._connect())
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="user-db")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+    def _with_conn(self, fn, *args):
+        conn = self._pool.get()
+        try:
+            return fn(conn, *args)
+        finally:
+            self._pool.put(conn)
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            await asyncio.to_thread(self.open)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._with_conn, fn, *args)
+
+    @staticmethod
+    def _select(conn, username):
+        return conn.execute(_SELECT_BY_USERNAME, (username,)).fetchone()
+
+    @staticmethod
+    def _insert(conn, username, email, password):
+        with conn:
+            conn.execute(_INSERT_USER, (username, email, password))
+
+    async def get_by_username(self, username: str):
+        """Returns (username, email, password_hash) or None."""
+        row = self._cache.get(username)
+        if row is not None:
+            self.cache_hits += 1
+            return row
+        self.cache_misses += 1
+        row = await self._run(self._select, username)
+        if row is not None:
+            self._cache.set(username, row, USER_CACHE_TTL)
+        return row
+
+    async def create(self, username: str, email: str, password_hash: str):
+        """Inserts a user; raises sqlite3.IntegrityError on duplicates."""
+        await self._run(self._insert, username, email, password_hash)
+        self._cache.delete(username)
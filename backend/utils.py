@@ -2,7 +2,16 @@
 
 
 
-import re, json, hashlib, math
+import os, re, json, hashlib, math
+from collections import deque
+from pydantic import ValidationError
+from tolerant_json import parse_tolerant
+from models import TriageData
+
+try:
+    import orjson
+except ImportError:  # optional fast encoder
+    orjson = None
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     R = 6371.0
@@ -11,53 +20,147 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     a = math.sin(dlat/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlon/2)**2
     return round(R * (2 * math.atan2(math.sqrt(a), math.sqrt(1-a))), 2)
 
+_json_decoder = json.JSONDecoder()
+
 def clean_ai_json(text: str):
-    """Attempt robust JSON extraction from model output.
+    """Extract the triage object from model output.
 
-    1. Strip markdown fences (``` or ```json)
-    2. Try direct json.loads
-    3. Fallback to finding the first {...} block and load
-    4. If that fails, try ast.literal_eval to handle single quotes
+    Well-formed JSON (possibly fenced or wrapped in prose) is decoded by the C
+    decoder straight from the first '{'. Anything else gets one tolerant pass
+    that handles single quotes, Python literals, trailing commas and truncated
+    output (see tolerant_json). Returns None unless the result is a complete
+    triage (see validate_triage).
     """
     try:
         if not text or not isinstance(text, str):
             return None
-
-        # 1. Strip markdown fences
-        cleaned = re.sub(r"```(?:json)?\s?|\s?```", "", text).strip()
-
-        # 2. Try direct JSON
-        try:
-            data = json.loads(cleaned)
-        except Exception:
-            # 3. Extract first JSON-like block
-            start = cleaned.find('{')
-            end = cleaned.rfind('}')
-            if start == -1 or end == -1 or end <= start:
-                data = None
-            else:
-                snippet = cleaned[start:end+1]
-                try:
-                    data = json.loads(snippet)
-                except Exception:
-                    # 4. Try ast.literal_eval as a last resort (handles single quotes)
-                    import ast
-                    try:
-                        data = ast.literal_eval(snippet)
-                    except Exception:
-                        data = None
-
-        if not data:
+        start = text.find("{")
+        if start == -1:
             return None
+        try:
+            data = _json_decoder.raw_decode(text, start)[0]
+        except ValueError:
+            data = parse_tolerant(text[start:])
+        return validate_triage(data)
+    except Exception:
+        return None
 
-        if "specialist" in data:
-            spec = data["specialist"]
-            data["specialist"] = spec[0] if isinstance(spec, list) else spec
+def validate_triage(data):
+    """data if it is a complete triage (every TriageData field valid), else None.
 
-        return data
-    except Exception:
+    Truncated output can parse into a dict with fields missing; that must
+    count as a parse failure, never reach a client or the cache.
+    """
+    if not data or not isinstance(data, dict):
         return None
+    normalize_triage_fields(data)
+    try:
+        TriageData(**data)
+    except ValidationError:
+        return None
+    return data
+
+def normalize_triage_fields(data: dict):
+    if "specialist" in data:
+        spec = data["specialist"]
+        data["specialist"] = (spec[0] if spec else "General Physician") if isinstance(spec, list) else spec
+    return data
+
+# Words that carry no triage signal; dropping them lets phrasing variants share a key
+_STOPWORDS = frozenset("""
+a an and are as at be been but by do does for from had has have having i i'm im in is it
+its me my of on or our since so some that the their them there this to too very was we
+were with feel feeling felt got getting also just really bit little lot lots am
+""".split())
+
+TRIAGE_GEOHASH_PRECISION = int(os.getenv("TRIAGE_GEOHASH_PRECISION", 6))
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# A negation applies to the rest of its clause; its terms are kept as
+# "no_<term>" so "chest pain but no fever" and "fever but no chest pain"
+# stay distinct after sorting
+_NEGATIONS = frozenset("no not without denies deny never dont doesnt didnt cant".split())
+_CLAUSE_BREAKS = frozenset("but and or however although though yet except while whereas".split())
+NEGATED_PREFIX = "no_"
+
+def normalize_symptoms(symptoms: str):
+    """Canonical symptom text: lowercase tokens, stopwords dropped, plurals folded,
+    negated terms prefixed with NEGATED_PREFIX, sorted."""
+    terms = set()
+    negated = False
+    for token in re.findall(r"[a-z0-9]+|[.,;:!?]", str(symptoms).lower().replace("'", "")):
+        if token in _CLAUSE_BREAKS or not token[0].isalnum():
+            negated = False
+            continue
+        if token in _NEGATIONS:
+            negated = True
+            continue
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.add(NEGATED_PREFIX + token if negated else token)
+    return " ".join(sorted(terms))
+
+def geohash_encode(lat: float, lon: float, precision: int = TRIAGE_GEOHASH_PRECISION):
+    """Standard base32 geohash (precision 6 is a ~1.2 x 0.6 km cell)."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+def triage_mode(is_mental: bool):
+    return "mental" if is_mental else "physical"
+
+def generate_triage_key(symptoms: str, mode: str = "physical"):
+    """Triage depends only on the symptoms and the mode, not the location."""
+    symp_hash = hashlib.md5(normalize_symptoms(symptoms).encode()).hexdigest()
+    return f"triage:{mode}:{symp_hash}"
+
+def generate_response_key(symptoms: str, latitude: float, longitude: float, mode: str = "physical"):
+    """Key of a fully serialized response (triage + hospitals for one cell)."""
+    symp_hash = hashlib.md5(normalize_symptoms(symptoms).encode()).hexdigest()
+    return f"response:{mode}:{geohash_encode(latitude, longitude)}:{symp_hash}"
+
+def generate_hospital_key(latitude: float, longitude: float, specialist: str, urgency: str):
+    """Hospital results depend on the geohash cell, the specialist and the emergency split."""
+    spec_hash = hashlib.md5(str(specialist).lower().strip().encode()).hexdigest()[:12]
+    tier = "emergency" if str(urgency).lower() == "high" else "routine"
+    return f"hospitals:{geohash_encode(latitude, longitude)}:{spec_hash}:{tier}"
+
+def dumps_json(data):
+    """Compact JSON text, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+class RollingPercentile:
+    """Percentiles over the most recent `window` samples."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def add(self, value: float):
+        self.samples.append(value)
+
+    def percentile(self, q: float, default=None):
+        if not self.samples:
+            return default
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
 
-def generate_cache_key(symptoms: str, latitude: float):
-    symp_hash = hashlib.md5(symptoms.lower().strip().encode()).hexdigest()
-    return f"triage_{symp_hash}_{round(latitude, 2)}"
\ No newline at end of file
+    def __len__(self):
+        return len(self.samples)